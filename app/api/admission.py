@@ -0,0 +1,56 @@
+from fastapi import HTTPException, Request
+
+from app.core.admission import AdmissionRejected, routes
+from app.core.config import settings
+from app.core.security import decode_token
+
+
+def _http_error(e: AdmissionRejected) -> HTTPException:
+    detail = "Too many requests" if e.status_code == 429 else "Server is busy, try again later"
+    return HTTPException(status_code=e.status_code, detail=detail, headers={"Retry-After": str(e.retry_after)})
+
+
+def _user_key(request: Request) -> str | None:
+    # id из токена без похода в БД; невалидный токен отклонит get_current_user
+    auth = request.headers.get("authorization", "")
+    scheme, _, token = auth.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        return str(decode_token(token).get("sub"))
+    except Exception:
+        return None
+
+
+def admit(route: str):
+    # Зависимость для дорогих маршрутов. Должна стоять в параметрах раньше get_conn /
+    # get_current_user, чтобы отклонённый запрос не занимал соединение из пула.
+    # За клиентским IP стоит request.client (за прокси - uvicorn --proxy-headers).
+    limits = routes[route]
+
+    async def dependency(request: Request):
+        if not settings.admission_enabled:
+            yield
+            return
+        try:
+            limits.check_ip(request.client.host if request.client else None)
+            limits.check_user(_user_key(request))
+            await limits.acquire()
+        except AdmissionRejected as e:
+            raise _http_error(e)
+        try:
+            yield
+        finally:
+            limits.release()
+
+    return dependency
+
+
+def check_user_rate(route: str, user_key: str) -> None:
+    # для маршрутов, где пользователь известен только из тела запроса (логин по email)
+    if not settings.admission_enabled:
+        return
+    try:
+        routes[route].check_user(user_key)
+    except AdmissionRejected as e:
+        raise _http_error(e)
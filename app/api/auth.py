@@ -2,9 +2,17 @@ from fastapi import APIRouter, Depends, HTTPException, Header
 from pydantic import BaseModel, EmailStr, Field
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi import Security
-from app.db import get_conn
-from app.core.security import verify_password, create_access_token, decode_token
-from app.services.users import get_user_by_email, create_user, get_user_by_id
+from app.api.admission import admit, check_user_rate
+from app.core.config import settings
+from app.db import get_conn, get_pool
+from app.core.security import (
+    create_access_token,
+    decode_token,
+    hash_password_async,
+    needs_rehash,
+    verify_password_async,
+)
+from app.services.users import get_user_by_email, create_user, get_user_cached, update_password_hash
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 bearer_scheme = HTTPBearer(auto_error=False)
@@ -24,13 +32,13 @@ class LoginIn(BaseModel):
 
 
 @router.post("/register")
-def register(payload: RegisterIn, conn=Depends(get_conn)):
-    exists = get_user_by_email(conn, payload.email)
+async def register(payload: RegisterIn, conn=Depends(get_conn)):
+    exists = await get_user_by_email(conn, payload.email)
     if exists:
         raise HTTPException(status_code=409, detail="Email already registered")
 
-    row = create_user(conn, payload.full_name, payload.email, payload.role, payload.password)
-    token = create_access_token(user_id=row[0], role=row[3])
+    row = await create_user(conn, payload.full_name, payload.email, payload.role, payload.password)
+    token = create_access_token(user_id=row[0], role=row[3], full_name=row[1], email=row[2])
     return {
         "user": {"id": row[0], "full_name": row[1], "email": row[2], "role": row[3]},
         "access_token": token,
@@ -39,23 +47,34 @@ def register(payload: RegisterIn, conn=Depends(get_conn)):
 
 
 @router.post("/login")
-def login(payload: LoginIn, conn=Depends(get_conn)):
-    row = get_user_by_email(conn, payload.email)
+async def login(payload: LoginIn, _admitted=Depends(admit("login")), conn=Depends(get_conn)):
+    check_user_rate("login", payload.email.lower())
+
+    row = await get_user_by_email(conn, payload.email)
     if not row:
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
     user_id, full_name, email, role, password_hash = row
-    if not verify_password(payload.password, password_hash):
+    if not await verify_password_async(payload.password, password_hash):
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
-    token = create_access_token(user_id=user_id, role=role)
+    # хеш со старым числом итераций - пересчитываем, пока знаем пароль
+    if needs_rehash(password_hash):
+        new_hash = await hash_password_async(payload.password)
+        await update_password_hash(conn, user_id, new_hash)
+
+    token = create_access_token(user_id=user_id, role=role, full_name=full_name, email=email)
     return {"access_token": token, "token_type": "bearer"}
 
 
-def get_current_user(
+async def get_current_user(
     credentials: HTTPAuthorizationCredentials | None = Security(bearer_scheme),
-    conn=Depends(get_conn),
 ):
+    # без Depends(get_conn): с полными claims в токене соединение из пула не нужно
+    return await user_from_credentials(credentials)
+
+
+async def user_from_credentials(credentials: HTTPAuthorizationCredentials | None, conn=None) -> dict:
     if credentials is None:
         raise HTTPException(status_code=401, detail="Missing token")
 
@@ -67,7 +86,17 @@ def get_current_user(
     except Exception:
         raise HTTPException(status_code=401, detail="Invalid token")
 
-    user = get_user_by_id(conn, user_id)
+    # токен подписан нами и содержит всё нужное - в БД не ходим
+    if settings.jwt_embed_user_claims and "name" in data and "email" in data:
+        return {"id": user_id, "full_name": data["name"], "email": data["email"], "role": data.get("role")}
+
+    if conn is None:
+        # соединение берём только на этот запрос и сразу возвращаем: get_current_user
+        # стоит в параметрах раньше get_conn, так что запрос не держит два соединения
+        async with get_pool().connection() as c:
+            user = await get_user_cached(c, user_id)
+    else:
+        user = await get_user_cached(conn, user_id)
     if not user:
         raise HTTPException(status_code=401, detail="User not found")
 
@@ -77,7 +106,7 @@ def get_current_user(
 
 
 @router.get("/me", dependencies=[Security(bearer_scheme)])
-def me(user=Depends(get_current_user)):
+async def me(user=Depends(get_current_user)):
     return {"user": user}
 
 
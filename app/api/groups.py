@@ -1,10 +1,36 @@
-from fastapi import APIRouter, Depends, HTTPException
-from pydantic import BaseModel, Field
+import asyncio
+import csv
+import io
+import json
 
-from app.db import get_conn
-from app.api.auth import get_current_user
-from app.services.groups import create_group, list_my_groups
-from app.services.participants import get_group_by_code, upsert_participant, list_queue
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request, Security
+from fastapi.responses import Response, StreamingResponse
+from fastapi.security import HTTPAuthorizationCredentials
+from pydantic import BaseModel, EmailStr, Field, ValidationError
+
+from app.core.config import settings
+from app.core.pagination import decode_cursor, encode_cursor
+from app.db import get_conn, get_pool
+from app.api.admission import admit
+from app.api.auth import bearer_scheme, get_current_user, user_from_credentials
+from app.api.timezones import LocalClock
+from app.queries import GROUP_OWNED, run_query
+from app.services.groups import create_group, list_my_groups, list_my_groups_json, list_my_groups_page
+from app.services.catalog import TimezoneCatalog, get_catalog
+from app.services.participants import (
+    clear_queue,
+    get_group_by_code,
+    list_group_offsets,
+    list_queue,
+    list_queue_json,
+    list_queue_page,
+    upsert_participant,
+    upsert_participants_batch,
+)
+from app.services.queue_events import hub
+
+# как часто слать комментарий в SSE-поток, чтобы прокси не закрывали соединение
+_SSE_PING_SECONDS = 15
 
 
 
@@ -20,32 +46,112 @@ class JoinIn(BaseModel):
     msk_offset_hours: int | None = Field(default=None, ge=-12, le=12)
 
 
+class BatchParticipantIn(BaseModel):
+    display_name: str = Field(min_length=1, max_length=200)
+    email: EmailStr | None = None
+    region: str | None = Field(default=None, max_length=200)
+    fias_code: str | None = Field(default=None, max_length=20)
+    msk_offset_hours: int | None = Field(default=None, ge=-12, le=12)
+
+
 def _require_teacher(user: dict):
     if user.get("role") != "teacher":
         raise HTTPException(status_code=403, detail="Only teacher can do this")
 
 
+async def _require_own_group(conn, group_id: int, teacher_id: int):
+    # группа должна принадлежать этому преподавателю
+    async with conn.cursor() as cur:
+        await run_query(cur, GROUP_OWNED, (group_id, teacher_id))
+        if await cur.fetchone() is None:
+            raise HTTPException(status_code=404, detail="Group not found")
+
+
 @router.post("")
-def create(payload: GroupCreateIn, user=Depends(get_current_user), conn=Depends(get_conn)):
+async def create(payload: GroupCreateIn, user=Depends(get_current_user), conn=Depends(get_conn)):
     _require_teacher(user)
 
     try:
-        return create_group(conn, teacher_id=user["id"], group_number=payload.group_number)
+        return await create_group(conn, teacher_id=user["id"], group_number=payload.group_number)
     except ValueError:
         raise HTTPException(status_code=409, detail="Group already exists")
 
 
+def _page_key(cursor: str | None) -> dict | None:
+    if cursor is None:
+        return None
+    try:
+        return decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+async def _fetch_page(fetch, conn, after):
+    try:
+        return await fetch(conn, after)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _stream_json(fetch, items: list[dict], key: dict | None, head: bytes = b"[", tail: bytes = b"]") -> StreamingResponse:
+    # Весь список порциями по stream_page_size: в памяти не больше одной порции.
+    # Первая порция уже прочитана обработчиком (там же ошибка курсора становится 400),
+    # за следующими соединение из пула берётся на каждую порцию, а не на всё время ответа.
+    async def body():
+        page, next_key = items, key
+        first = True
+        yield head
+        while True:
+            for item in page:
+                yield (b"" if first else b",") + json.dumps(item, ensure_ascii=False).encode("utf-8")
+                first = False
+            if next_key is None:
+                break
+            async with get_pool().connection() as conn:
+                page, next_key = await fetch(conn, next_key)
+        yield tail
+
+    return StreamingResponse(body(), media_type="application/json")
+
+
 @router.get("/my")
-def my_groups(user=Depends(get_current_user), conn=Depends(get_conn)):
+async def my_groups(
+    limit: int | None = Query(default=None, ge=1, le=settings.page_max_limit),
+    cursor: str | None = None,
+    stream: bool = False,
+    user=Depends(get_current_user),
+    conn=Depends(get_conn),
+):
+    # без limit/cursor/stream - прежний ответ: весь список одним массивом
     _require_teacher(user)
-    return list_my_groups(conn, teacher_id=user["id"])
+    after = _page_key(cursor)
+
+    if limit is None and after is None and not stream:
+        if settings.list_json_from_db:
+            return Response(await list_my_groups_json(conn, user["id"]), media_type="application/json")
+        return await list_my_groups(conn, teacher_id=user["id"])
+
+    size = settings.stream_page_size if stream else (limit or settings.page_max_limit)
+
+    async def fetch(c, k):
+        return await list_my_groups_page(c, user["id"], size, k)
+
+    items, key = await _fetch_page(fetch, conn, after)
+    if stream:
+        return _stream_json(fetch, items, key)
+    return {"groups": items, "next_cursor": key and encode_cursor(key)}
 
 @router.post("/join")
-def join(payload: JoinIn, user=Depends(get_current_user), conn=Depends(get_conn)):
+async def join(
+    payload: JoinIn,
+    _admitted=Depends(admit("join")),
+    user=Depends(get_current_user),
+    conn=Depends(get_conn),
+):
     if user.get("role") != "student":
         raise HTTPException(status_code=403, detail="Only student can join")
 
-    grp = get_group_by_code(conn, payload.join_code)
+    grp = await get_group_by_code(conn, payload.join_code)
     if not grp:
         raise HTTPException(status_code=404, detail="Group not found")
 
@@ -54,7 +160,7 @@ def join(payload: JoinIn, user=Depends(get_current_user), conn=Depends(get_conn)
     # ФИО берём из профиля
     display_name = user.get("full_name") or user.get("email") or "Student"
 
-    item = upsert_participant(
+    item = await upsert_participant(
         conn,
         group_id=group_id,
         user_id=user["id"],
@@ -66,36 +172,231 @@ def join(payload: JoinIn, user=Depends(get_current_user), conn=Depends(get_conn)
     return {"group_id": group_id, "participant": item}
 
 
-@router.get("/{group_id}/queue")
-def queue(group_id: int, user=Depends(get_current_user), conn=Depends(get_conn)):
+def _resolve_batch_item(item: BatchParticipantIn, catalog: TimezoneCatalog) -> dict:
+    # регион/ФИАС ищем в справочнике в памяти; явный msk_offset_hours без региона - как есть
+    region = item.region
+    msk = item.msk_offset_hours
+    if item.fias_code or item.region:
+        row = catalog.find(region=item.region, fias_code=item.fias_code)
+        if row is None:
+            raise ValueError("Region not found")
+        region = row.region
+        msk = row.msk_offset_hours
+    return {
+        "display_name": item.display_name.strip(),
+        "email": item.email,
+        "region": region,
+        "msk_offset_hours": msk,
+    }
+
+
+async def _import_participants(conn, catalog: TimezoneCatalog, group_id: int, raw_rows: list[dict]) -> dict:
+    if len(raw_rows) > settings.batch_join_max_rows:
+        raise HTTPException(status_code=413, detail=f"Too many rows (max {settings.batch_join_max_rows})")
+
+    results: list[dict] = []
+    items: list[dict] = []
+    positions: list[int] = []  # индекс в results для каждой строки items
+
+    for i, raw in enumerate(raw_rows):
+        try:
+            item = BatchParticipantIn.model_validate(raw)
+            resolved = _resolve_batch_item(item, catalog)
+        except ValidationError as e:
+            results.append({"row": i, "status": "error", "error": e.errors(include_url=False, include_context=False)})
+            continue
+        except ValueError as e:
+            results.append({"row": i, "status": "error", "error": str(e)})
+            continue
+        positions.append(len(results))
+        results.append({"row": i, "status": "ok"})
+        items.append(resolved)
+
+    participants = await upsert_participants_batch(conn, group_id, items)
+    for idx, participant in zip(positions, participants):
+        if participant is None:
+            results[idx] = {"row": results[idx]["row"], "status": "skipped", "error": "Duplicate participant in batch"}
+        else:
+            results[idx]["participant"] = participant
+
+    return {
+        "group_id": group_id,
+        "imported": sum(1 for r in results if r["status"] == "ok"),
+        "skipped": sum(1 for r in results if r["status"] == "skipped"),
+        "failed": sum(1 for r in results if r["status"] == "error"),
+        "results": results,
+    }
+
+
+@router.post("/{group_id}/participants/batch")
+async def join_batch(
+    group_id: int,
+    # строки проверяем по одной, чтобы ошибка в одной не отклоняла весь список
+    payload: list[dict] = Body(...),
+    user=Depends(get_current_user),
+    conn=Depends(get_conn),
+    catalog: TimezoneCatalog = Depends(get_catalog),
+):
+    # предзаполнение очереди группы списком студентов (JSON-массив)
     _require_teacher(user)
+    await _require_own_group(conn, group_id, user["id"])
+    return await _import_participants(conn, catalog, group_id, payload)
 
-    # проверим, что группа принадлежит этому преподавателю
-    with conn.cursor() as cur:
-        cur.execute(
-            "select 1 from groups where id=%s and teacher_id=%s limit 1",
-            (group_id, user["id"]),
-        )
-        if cur.fetchone() is None:
-            raise HTTPException(status_code=404, detail="Group not found")
 
-    return {"group_id": group_id, "queue": list_queue(conn, group_id)}
+@router.post("/{group_id}/participants/import")
+async def join_batch_csv(
+    group_id: int,
+    request: Request,
+    user=Depends(get_current_user),
+    conn=Depends(get_conn),
+    catalog: TimezoneCatalog = Depends(get_catalog),
+):
+    # то же из CSV (тело запроса text/csv, разделитель "," или ";"):
+    # display_name,email,region,fias_code,msk_offset_hours
+    _require_teacher(user)
+    await _require_own_group(conn, group_id, user["id"])
+
+    try:
+        text = (await request.body()).decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="CSV must be UTF-8")
+
+    first_line = text.split("\n", 1)[0]
+    delimiter = ";" if first_line.count(";") > first_line.count(",") else ","
+    reader = csv.DictReader(io.StringIO(text), delimiter=delimiter)
+    raw_rows = [{k.strip(): (v.strip() or None) for k, v in r.items() if k and v is not None} for r in reader]
 
-@router.post("/{group_id}/finish")
-def finish(group_id: int, user=Depends(get_current_user), conn=Depends(get_conn)):
+    return await _import_participants(conn, catalog, group_id, raw_rows)
+
+
+@router.get("/{group_id}/now")
+async def group_now(
+    group_id: int,
+    compact: bool = False,
+    user=Depends(get_current_user),
+    conn=Depends(get_conn),
+):
+    # местное время всех участников группы за один запрос (для панели преподавателя)
     _require_teacher(user)
+    await _require_own_group(conn, group_id, user["id"])
 
-    # группа должна принадлежать этому преподавателю
-    with conn.cursor() as cur:
-        cur.execute(
-            "select 1 from groups where id=%s and teacher_id=%s limit 1",
-            (group_id, user["id"]),
-        )
-        if cur.fetchone() is None:
-            raise HTTPException(status_code=404, detail="Group not found")
+    clock = LocalClock()
+    items = await list_group_offsets(conn, group_id)
+    for it in items:
+        offset = it["msk_offset_hours"]
+        it["utc_offset_hours"] = None if offset is None else offset + clock.msk_utc_offset_hours
+        if not compact:
+            it["local_time"] = None if offset is None else clock.local_time_for_msk_offset(offset)
 
-        cur.execute("delete from participants where group_id=%s", (group_id,))
-        deleted = cur.rowcount
+    out = {"group_id": group_id, "items": items}
+    if compact:
+        out.update(clock.header())
+    else:
+        out["msk_time"] = clock.header()["msk_time"]
+    return out
+
+
+@router.get("/{group_id}/queue")
+async def queue(
+    group_id: int,
+    limit: int | None = Query(default=None, ge=1, le=settings.page_max_limit),
+    cursor: str | None = None,
+    stream: bool = False,
+    user=Depends(get_current_user),
+    conn=Depends(get_conn),
+):
+    # без limit/cursor/stream - вся очередь одним списком, как раньше
+    _require_teacher(user)
+    await _require_own_group(conn, group_id, user["id"])
+    after = _page_key(cursor)
+
+    if limit is None and after is None and not stream:
+        if settings.list_json_from_db:
+            return Response(await list_queue_json(conn, group_id), media_type="application/json")
+        return {
+            "group_id": group_id,
+            "day_start_hour": settings.queue_day_start_hour,
+            "queue": await list_queue(conn, group_id),
+        }
+
+    size = settings.stream_page_size if stream else (limit or settings.page_max_limit)
+
+    async def fetch(c, k):
+        return await list_queue_page(c, group_id, size, k)
+
+    items, key = await _fetch_page(fetch, conn, after)
+    if stream:
+        # тот же объект, что и без stream, только массив queue отдаётся порциями
+        head = f'{{"group_id": {group_id}, "day_start_hour": {settings.queue_day_start_hour}, "queue": ['
+        return _stream_json(fetch, items, key, head=head.encode("utf-8"), tail=b"]}")
+    return {
+        "group_id": group_id,
+        "day_start_hour": settings.queue_day_start_hour,
+        "queue": items,
+        "next_cursor": key and encode_cursor(key),
+    }
+
+
+def _sse(data: dict) -> bytes:
+    return f"data: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+
+
+@router.get("/{group_id}/queue/events")
+async def queue_events(
+    group_id: int,
+    credentials: HTTPAuthorizationCredentials | None = Security(bearer_scheme),
+):
+    # Server-Sent Events: сначала снимок очереди, потом изменения (upsert / clear / resync).
+    # Соединение из пула берём только на проверки и снимок, а не на всё время потока.
+    async with get_pool().connection() as conn:
+        user = await user_from_credentials(credentials, conn)
+        _require_teacher(user)
+        await _require_own_group(conn, group_id, user["id"])
+
+        # подписываемся до снимка, чтобы не потерять изменения между ними
+        sub = hub.subscribe(group_id)
+        try:
+            snapshot = await list_queue(conn, group_id)
+        except BaseException:
+            hub.unsubscribe(group_id, sub)
+            raise
+
+    async def stream():
+        try:
+            yield _sse(
+                {
+                    "group_id": group_id,
+                    "op": "snapshot",
+                    "day_start_hour": settings.queue_day_start_hour,
+                    "queue": snapshot,
+                }
+            )
+            while True:
+                try:
+                    event = await asyncio.wait_for(sub.get(), timeout=_SSE_PING_SECONDS)
+                except asyncio.TimeoutError:
+                    yield b": ping\n\n"
+                    continue
+                yield _sse(event)
+        finally:
+            hub.unsubscribe(group_id, sub)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.post("/{group_id}/finish")
+async def finish(
+    group_id: int,
+    # перенести очередь в participants_history (по умолчанию QUEUE_FINISH_ARCHIVE)
+    archive: bool | None = Query(default=None),
+    user=Depends(get_current_user),
+    conn=Depends(get_conn),
+):
+    _require_teacher(user)
+    await _require_own_group(conn, group_id, user["id"])
 
-    conn.commit()
+    deleted = await clear_queue(conn, group_id, archive)
     return {"group_id": group_id, "deleted": deleted}
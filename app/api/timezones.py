@@ -1,23 +1,78 @@
 from __future__ import annotations
 
+import hashlib
+import json
 from datetime import datetime, timedelta, timezone
-import re
+from pathlib import Path
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from pydantic import BaseModel, Field
+
+from app import queries
+from app.core import normalize
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.normalize import norm_region
+from app.db import get_pool
+from app.services import catalog as catalog_module, search_index
+from app.services.catalog import TimezoneCatalog, get_catalog
+from app.services.search_index import search_regions_db, search_regions_db_json
+from app.services.zones import MOSCOW, get_offset_table, moscow_offset_hours, zone_for_msk_offset
+from app.timezones_service import TimezoneRow
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+router = APIRouter(prefix="/timezones", tags=["timezones"])
 
-from app.db import get_conn
-from app.services.bootstrap import norm_region
 
-router = APIRouter(prefix="/timezones", tags=["timezones"])
+class NowBatchIn(BaseModel):
+    fias_codes: list[str] = Field(default_factory=list, max_length=settings.timezones_now_batch_max)
+    regions: list[str] = Field(default_factory=list, max_length=settings.timezones_now_batch_max)
+    # compact: только смещения и одно опорное время, часы клиент рисует сам
+    compact: bool = False
 
+# Ответы /search и /resolve зависят от справочника, запроса и кода поиска/ранжирования
+# с его настройками, поэтому кэшируются по нормализованному запросу и версии ответов:
+# версия справочника плюс отпечаток кода и настроек (после выкладки ETag меняется).
+_responses = TTLCache(settings.timezones_response_cache_size, settings.timezones_response_cache_ttl)
 
-def _fmt(dt: datetime) -> str:
-    return dt.strftime("%Y-%m-%d %H:%M:%S")
+
+def _code_fingerprint() -> str:
+    h = hashlib.sha256()
+    for path in [Path(__file__), *(Path(m.__file__) for m in (catalog_module, search_index, normalize, queries))]:
+        h.update(path.read_bytes())
+    h.update(
+        f"{settings.timezones_search_backend}\t{settings.timezones_fuzzy_threshold}\t{settings.list_json_from_db}".encode()
+    )
+    return h.hexdigest()[:8]
+
+
+_CODE_FINGERPRINT = _code_fingerprint()
+
+
+def _version(catalog: TimezoneCatalog) -> str:
+    return f"{catalog.version}-{_CODE_FINGERPRINT}"
+
+
+def _cache_headers(catalog: TimezoneCatalog) -> dict:
+    return {
+        "ETag": f'"{_version(catalog)}"',
+        "Cache-Control": f"public, max-age={settings.timezones_cache_max_age}",
+    }
 
 
-def _msk_now() -> datetime:
-    # Москва = UTC+3 
-    return datetime.now(timezone.utc) + timedelta(hours=3)
+def _not_modified(request: Request, catalog: TimezoneCatalog) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = {t.strip().removeprefix("W/") for t in header.split(",")}
+    return "*" in tags or f'"{_version(catalog)}"' in tags
+
+
+def response_cache_stats() -> dict:
+    return _responses.stats()
+
+
+def _fmt(dt: datetime) -> str:
+    return dt.strftime("%Y-%m-%d %H:%M:%S")
 
 
 def _label(msk_offset_hours: int, utc_offset_hours: int) -> str:
@@ -27,170 +82,191 @@ def _label(msk_offset_hours: int, utc_offset_hours: int) -> str:
 
 
 @router.get("/search")
-def search(
+async def search(
+    request: Request,
     q: str = Query(..., min_length=1),
     limit: int = Query(10, ge=1, le=50),
-    conn=Depends(get_conn),
+    catalog: TimezoneCatalog = Depends(get_catalog),
 ):
-    qq = q.strip()
-
-    with conn.cursor() as cur:
-        cur.execute(
-            """
-            select region, msk_offset_hours, utc_offset_hours, fias_code
-            from timezones
-            where region ilike %s
-            order by region
-            limit %s
-            """,
-            (f"%{qq}%", limit),
-        )
-        rows = cur.fetchall()
-
-    return [
-        {
-            "region": r[0],
-            "msk_offset_hours": int(r[1]),
-            "utc_offset_hours": int(r[2]),
-            "fias_code": r[3],
-        }
-        for r in rows
-    ]
-
-
-@router.get("/resolve")
-def resolve(
-    region: str = Query(..., min_length=1),
-    limit: int = Query(20, ge=1, le=50),
-    conn=Depends(get_conn),
-):
-    nr = norm_region(region)
-
-    with conn.cursor() as cur:
-        # точное совпадение по нормализованному названию
-        cur.execute(
-            """
-            select region, msk_offset_hours, utc_offset_hours, fias_code
-            from timezones
-            where region_norm = %s
-            order by msk_offset_hours desc, region
-            limit %s
-            """,
-            (nr, limit),
-        )
-        rows = cur.fetchall()
-
-        # если ничего не нашли - пробуем contains
-        if not rows:
-            cur.execute(
-                """
-                select region, msk_offset_hours, utc_offset_hours, fias_code
-                from timezones
-                where region_norm ilike %s
-                order by msk_offset_hours desc, region
-                limit %s
-                """,
-                (f"%{nr}%", limit),
-            )
-            rows = cur.fetchall()
-
-    if not rows:
-        raise HTTPException(status_code=404, detail="Region not found")
+    headers = _cache_headers(catalog)
+    if _not_modified(request, catalog):
+        return Response(status_code=304, headers=headers)
+
+    key = ("search", _version(catalog), norm_region(q), limit)
+    body = _responses.get(key)
+    if body is None and settings.timezones_search_backend == "db" and settings.list_json_from_db:
+        async with get_pool().connection() as conn:
+            body = await search_regions_db_json(conn, q, limit)
+        _responses.set(key, body)
+
+    if body is None:
+        if settings.timezones_search_backend == "db":
+            async with get_pool().connection() as conn:
+                rows = await search_regions_db(conn, q, limit)
+        else:
+            rows = catalog.search(q, limit)
+
+        body = json.dumps(
+            [
+                {
+                    "region": r.region,
+                    "msk_offset_hours": r.msk_offset_hours,
+                    "utc_offset_hours": r.utc_offset_hours,
+                    "fias_code": r.fias_code,
+                }
+                for r in rows
+            ],
+            ensure_ascii=False,
+        ).encode("utf-8")
+        _responses.set(key, body)
+
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def _resolve_variants(catalog: TimezoneCatalog, region: str, limit: int) -> list[dict]:
+    rows = catalog.resolve(region, limit)
 
     # чтобы не показывать одинаковые варианты несколько раз
     seen = set()
     variants = []
     for r in rows:
-        key = (int(r[1]), int(r[2]))
+        key = (r.msk_offset_hours, r.utc_offset_hours)
         if key in seen:
             continue
         seen.add(key)
 
-        msk = int(r[1])
-        utc = int(r[2])
-
         variants.append(
             {
-                "region": r[0],
-                "msk_offset_hours": msk,
-                "utc_offset_hours": utc,
-                "fias_code": r[3],
-                "label": _label(msk, utc),
+                "region": r.region,
+                "msk_offset_hours": r.msk_offset_hours,
+                "utc_offset_hours": r.utc_offset_hours,
+                "fias_code": r.fias_code,
+                "label": _label(r.msk_offset_hours, r.utc_offset_hours),
             }
         )
+    return variants
 
-    return {
-        "input_region": region,
-        "needs_choice": len(variants) > 1,
-        "variants": variants,
+
+@router.get("/resolve")
+async def resolve(
+    request: Request,
+    region: str = Query(..., min_length=1),
+    limit: int = Query(20, ge=1, le=50),
+    catalog: TimezoneCatalog = Depends(get_catalog),
+):
+    headers = _cache_headers(catalog)
+    if _not_modified(request, catalog):
+        return Response(status_code=304, headers=headers)
+
+    # в ответе есть исходная строка input_region, поэтому кэшируем только варианты
+    key = ("resolve", _version(catalog), norm_region(region), limit)
+    variants = _responses.get(key)
+    if variants is None:
+        variants = _resolve_variants(catalog, region, limit)
+        _responses.set(key, variants)
+
+    if not variants:
+        raise HTTPException(status_code=404, detail="Region not found")
+
+    body = json.dumps(
+        {
+            "input_region": region,
+            "needs_choice": len(variants) > 1,
+            "variants": variants,
+        },
+        ensure_ascii=False,
+    ).encode("utf-8")
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+class LocalClock:
+    # Одно чтение часов на весь запрос. Местное время по зоне IANA: смещение берётся
+    # из заранее посчитанной таблицы переходов (один bisect) и запоминается на запрос.
+
+    def __init__(self):
+        self.utc_now = datetime.now(timezone.utc)
+        self._ts = self.utc_now.timestamp()
+        self._local: dict[str, str] = {}
+        self.msk_time = self.local_time(MOSCOW)
+        self.msk_utc_offset_hours = moscow_offset_hours(self.utc_now)
+
+    def local_time(self, tz_name: str) -> str:
+        s = self._local.get(tz_name)
+        if s is None:
+            offset = get_offset_table(tz_name).offset_at(self._ts)
+            s = _fmt(self.utc_now + timedelta(seconds=offset))
+            self._local[tz_name] = s
+        return s
+
+    def local_time_for_msk_offset(self, msk_offset_hours: int) -> str:
+        return self.local_time(zone_for_msk_offset(msk_offset_hours, self.utc_now))
+
+    def header(self) -> dict:
+        # опорное время для compact-ответов: клиент прибавляет к нему смещения
+        return {
+            "msk_time": self.msk_time,
+            "utc_timestamp": int(self._ts),
+        }
+
+
+def _now_item(row: TimezoneRow, clock: LocalClock, compact: bool = False) -> dict:
+    item = {
+        "region": row.region,
+        "fias_code": row.fias_code,
+        "msk_offset_hours": row.msk_offset_hours,
+        "utc_offset_hours": row.utc_offset_hours,
+        "tz": row.tz_name,
     }
+    if not compact:
+        item["label"] = _label(row.msk_offset_hours, row.utc_offset_hours)
+        item["msk_time"] = clock.msk_time
+        item["local_time"] = clock.local_time(row.tz_name)
+    return item
 
 
 @router.get("/now")
-def now(
+async def now(
     region: str | None = Query(default=None, min_length=1),
     fias_code: str | None = Query(default=None, min_length=1),
-    conn=Depends(get_conn),
+    catalog: TimezoneCatalog = Depends(get_catalog),
 ):
-    row = None
-
-    with conn.cursor() as cur:
-        if fias_code:
-            cur.execute(
-                """
-                select region, msk_offset_hours, utc_offset_hours, fias_code
-                from timezones
-                where fias_code = %s
-                limit 1
-                """,
-                (fias_code,),
-            )
-            row = cur.fetchone()
-
-        if row is None and region:
-            nr = norm_region(region)
-
-            cur.execute(
-                """
-                select region, msk_offset_hours, utc_offset_hours, fias_code
-                from timezones
-                where region_norm = %s
-                order by msk_offset_hours desc, region
-                limit 1
-                """,
-                (nr,),
-            )
-            row = cur.fetchone()
-
-            if row is None:
-                cur.execute(
-                    """
-                    select region, msk_offset_hours, utc_offset_hours, fias_code
-                    from timezones
-                    where region_norm ilike %s
-                    order by msk_offset_hours desc, region
-                    limit 1
-                    """,
-                    (f"%{nr}%",),
-                )
-                row = cur.fetchone()
+    row = catalog.find(region=region, fias_code=fias_code)
 
     if row is None:
         raise HTTPException(status_code=404, detail="Region not found")
 
-    db_region, msk_offset_hours, utc_offset_hours, db_fias = row
-    msk_offset_hours = int(msk_offset_hours)
-    utc_offset_hours = int(utc_offset_hours)
+    return _now_item(row, LocalClock())
 
-    msk_now = _msk_now()
-    local_now = msk_now + timedelta(hours=msk_offset_hours)
 
-    return {
-        "region": db_region,
-        "fias_code": db_fias,
-        "msk_offset_hours": msk_offset_hours,
-        "utc_offset_hours": utc_offset_hours,
-        "label": _label(msk_offset_hours, utc_offset_hours),
-        "msk_time": _fmt(msk_now),
-        "local_time": _fmt(local_now),
-    }
+@router.post("/now/batch")
+async def now_batch(payload: NowBatchIn, catalog: TimezoneCatalog = Depends(get_catalog)):
+    # Время сразу для многих регионов: один проход по справочнику и одно чтение часов.
+    # Ненайденные коды/названия не валят весь ответ, а попадают в not_found.
+    clock = LocalClock()
+    items = []
+    not_found = []
+
+    for code in payload.fias_codes:
+        row = catalog.by_fias.get(code.strip())
+        if row is None:
+            not_found.append({"fias_code": code})
+            continue
+        items.append(_now_item(row, clock, payload.compact))
+
+    resolved: dict[str, TimezoneRow | None] = {}
+    for region in payload.regions:
+        nr = norm_region(region)
+        if nr not in resolved:
+            resolved[nr] = catalog.find(region=region)
+        row = resolved[nr]
+        if row is None:
+            not_found.append({"region": region})
+            continue
+        item = _now_item(row, clock, payload.compact)
+        item["input_region"] = region
+        items.append(item)
+
+    out = {"items": items, "not_found": not_found}
+    if payload.compact:
+        out.update(clock.header())
+    return out
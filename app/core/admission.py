@@ -0,0 +1,182 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict
+from typing import Hashable
+
+from app.core.config import settings
+from app.core.metrics import Counter, Gauge, register
+
+# Допуск запросов на дорогие маршруты (логин, вход в группу): лимит одновременных
+# запросов с короткой очередью и token bucket по IP и по пользователю. Лишние
+# запросы отклоняются сразу, а не копятся в очереди к PBKDF2 и пулу соединений.
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, status_code: int, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class RateLimiter:
+    # token bucket на ключ: burst токенов, пополнение rate токенов в секунду.
+    # Ключи в LRU ограниченного размера, как в TTLCache.
+
+    def __init__(self, rate: float, burst: float, maxsize: int = 100_000):
+        self.rate = rate
+        self.burst = burst
+        self.maxsize = maxsize
+        self._buckets: OrderedDict[Hashable, list[float]] = OrderedDict()
+
+    @classmethod
+    def from_spec(cls, spec: str) -> "RateLimiter | None":
+        # "30/60" - 30 запросов за 60 секунд; пусто или "0" - без лимита
+        spec = (spec or "").strip()
+        if not spec or spec == "0":
+            return None
+        count, _, seconds = spec.partition("/")
+        count, seconds = float(count), float(seconds or 1)
+        if count <= 0 or seconds <= 0:
+            return None
+        return cls(rate=count / seconds, burst=count)
+
+    def hit(self, key: Hashable) -> float:
+        # 0 - запрос пропущен, иначе через сколько секунд появится токен
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = [self.burst, now]
+            self._buckets[key] = bucket
+            if len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return 0.0
+        return (1 - bucket[0]) / self.rate
+
+
+class RouteAdmission:
+    def __init__(
+        self,
+        name: str,
+        max_concurrency: int,
+        max_queue: int,
+        per_ip: RateLimiter | None,
+        per_user: RateLimiter | None,
+    ):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.per_ip = per_ip
+        self.per_user = per_user
+        self._slots: asyncio.Semaphore | None = None
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = {"rate_ip": 0, "rate_user": 0, "queue_full": 0, "queue_timeout": 0}
+
+    def _reject(self, status_code: int, reason: str, retry_after: float):
+        self.rejected[reason] += 1
+        ADMISSION_REJECTED.inc(1, self.name, reason)
+        raise AdmissionRejected(status_code, reason, retry_after)
+
+    def check_ip(self, ip: str | None) -> None:
+        if self.per_ip is not None and ip:
+            wait = self.per_ip.hit(ip)
+            if wait:
+                self._reject(429, "rate_ip", wait)
+
+    def check_user(self, user_key: str | None) -> None:
+        if self.per_user is not None and user_key:
+            wait = self.per_user.hit(user_key)
+            if wait:
+                self._reject(429, "rate_user", wait)
+
+    async def acquire(self) -> None:
+        # место среди max_concurrency выполняющихся; очередь не длиннее max_queue
+        # и ждём не дольше admission_queue_timeout - иначе 503
+        if self.max_concurrency <= 0:
+            self.active += 1
+            self.admitted += 1
+            return
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+
+        if self._slots.locked():
+            if self.waiting >= self.max_queue:
+                self._reject(503, "queue_full", settings.admission_retry_after)
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), settings.admission_queue_timeout)
+            except asyncio.TimeoutError:
+                self._reject(503, "queue_timeout", settings.admission_retry_after)
+            finally:
+                self.waiting -= 1
+        else:
+            await self._slots.acquire()
+
+        self.active += 1
+        self.admitted += 1
+
+    def release(self) -> None:
+        self.active -= 1
+        if self._slots is not None:
+            self._slots.release()
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+        }
+
+
+ADMISSION_REJECTED = register(
+    Counter("admission_rejected_total", "Requests rejected by admission control", ("route", "reason"))
+)
+
+routes = {
+    "login": RouteAdmission(
+        "login",
+        settings.login_max_concurrency,
+        settings.login_max_queue,
+        RateLimiter.from_spec(settings.login_rate_per_ip),
+        RateLimiter.from_spec(settings.login_rate_per_user),
+    ),
+    "join": RouteAdmission(
+        "join",
+        settings.join_max_concurrency,
+        settings.join_max_queue,
+        RateLimiter.from_spec(settings.join_rate_per_ip),
+        RateLimiter.from_spec(settings.join_rate_per_user),
+    ),
+}
+
+register(
+    Gauge(
+        "admission_waiting",
+        "Requests waiting for an admission slot",
+        lambda: {(name,): r.waiting for name, r in routes.items()},
+        ("route",),
+    )
+)
+register(
+    Gauge(
+        "admission_active",
+        "Requests holding an admission slot",
+        lambda: {(name,): r.active for name, r in routes.items()},
+        ("route",),
+    )
+)
+
+
+def admission_stats() -> dict:
+    return {name: r.stats() for name, r in routes.items()}
@@ -12,5 +12,87 @@ class Settings:
     )
     jwt_secret: str = os.getenv("JWT_SECRET", "change_me")
     jwt_expire_minutes: int = int(os.getenv("JWT_EXPIRE_MINUTES", "1440"))
+    # класть имя/email/роль в токен и доверять им без запроса к БД
+    jwt_embed_user_claims: bool = os.getenv("JWT_EMBED_USER_CLAIMS", "1") == "1"
+
+    # кэш пользователей для токенов без этих полей
+    user_cache_ttl: float = float(os.getenv("USER_CACHE_TTL", "60"))
+    user_cache_size: int = int(os.getenv("USER_CACHE_SIZE", "2048"))
+
+    # PBKDF2 в пуле процессов: 0 - по числу ядер
+    password_hash_workers: int = int(os.getenv("PASSWORD_HASH_WORKERS", "0"))
+    # сколько хешей считается одновременно (0 - по числу воркеров), остальные ждут в очереди
+    password_hash_concurrency: int = int(os.getenv("PASSWORD_HASH_CONCURRENCY", "0"))
+    # кэш успешных проверок пароля при логине (0 - выключен)
+    password_verify_cache_ttl: float = float(os.getenv("PASSWORD_VERIFY_CACHE_TTL", "300"))
+    password_verify_cache_size: int = int(os.getenv("PASSWORD_VERIFY_CACHE_SIZE", "1024"))
+
+    # час местного времени, с которого начинается "день" при упорядочивании очереди
+    queue_day_start_hour: int = int(os.getenv("QUEUE_DAY_START_HOUR", "6"))
+
+    # POST /groups/{id}/finish по умолчанию переносит очередь в participants_history
+    # (история не чистится сама, поэтому по умолчанию выключено)
+    queue_finish_archive: bool = os.getenv("QUEUE_FINISH_ARCHIVE", "0") == "1"
+
+    # максимум строк в одном пакетном добавлении участников
+    batch_join_max_rows: int = int(os.getenv("BATCH_JOIN_MAX_ROWS", "1000"))
+
+    # сколько кодов подключения генерировать за раз, когда запас кончился
+    join_code_pool_refill: int = int(os.getenv("JOIN_CODE_POOL_REFILL", "500"))
+
+    # HTTP-кэш /timezones/search и /resolve (Cache-Control: max-age) и кэш ответов на сервере
+    timezones_cache_max_age: int = int(os.getenv("TIMEZONES_CACHE_MAX_AGE", "3600"))
+    timezones_response_cache_size: int = int(os.getenv("TIMEZONES_RESPONSE_CACHE_SIZE", "4096"))
+    timezones_response_cache_ttl: float = float(os.getenv("TIMEZONES_RESPONSE_CACHE_TTL", "3600"))
+
+    # на сколько лет вперёд считать таблицы переходов смещений по зонам IANA
+    timezones_offset_table_years: int = int(os.getenv("TIMEZONES_OFFSET_TABLE_YEARS", "10"))
+
+    # максимум регионов в одном запросе POST /timezones/now/batch
+    timezones_now_batch_max: int = int(os.getenv("TIMEZONES_NOW_BATCH_MAX", "500"))
+
+    # /metrics (формат Prometheus), счётчики SQL по запросам и заголовок Server-Timing
+    metrics_enabled: bool = os.getenv("METRICS_ENABLED", "1") == "1"
+    server_timing_enabled: bool = os.getenv("SERVER_TIMING_ENABLED", "1") == "1"
+
+    # постраничные /groups/my и /groups/{id}/queue: максимум ?limit= и размер порции при ?stream=1
+    page_max_limit: int = int(os.getenv("PAGE_MAX_LIMIT", "500"))
+    stream_page_size: int = int(os.getenv("STREAM_PAGE_SIZE", "500"))
+
+    # допуск запросов на /auth/login и /groups/join: одновременно выполняющиеся,
+    # длина очереди за ними и сколько в ней ждать (дальше 503 с Retry-After)
+    admission_enabled: bool = os.getenv("ADMISSION_ENABLED", "1") == "1"
+    admission_queue_timeout: float = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "2"))
+    admission_retry_after: float = float(os.getenv("ADMISSION_RETRY_AFTER", "1"))
+    login_max_concurrency: int = int(os.getenv("LOGIN_MAX_CONCURRENCY", "32"))
+    login_max_queue: int = int(os.getenv("LOGIN_MAX_QUEUE", "128"))
+    join_max_concurrency: int = int(os.getenv("JOIN_MAX_CONCURRENCY", "64"))
+    join_max_queue: int = int(os.getenv("JOIN_MAX_QUEUE", "256"))
+    # token bucket "запросов/секунд" (0 - без лимита, дальше 429 с Retry-After);
+    # по IP лимиты широкие: весь класс может сидеть за одним NAT
+    login_rate_per_ip: str = os.getenv("LOGIN_RATE_PER_IP", "300/60")
+    login_rate_per_user: str = os.getenv("LOGIN_RATE_PER_USER", "10/60")
+    join_rate_per_ip: str = os.getenv("JOIN_RATE_PER_IP", "600/60")
+    join_rate_per_user: str = os.getenv("JOIN_RATE_PER_USER", "30/60")
+
+    # полные списки /groups/my и /groups/{id}/queue (и поиск при backend=db) собирать в JSON в Postgres
+    list_json_from_db: bool = os.getenv("LIST_JSON_FROM_DB", "1") == "1"
+
+    # пул соединений с Postgres
+    db_pool_min_size: int = int(os.getenv("DB_POOL_MIN_SIZE", "2"))
+    db_pool_max_size: int = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+    db_pool_max_idle: float = float(os.getenv("DB_POOL_MAX_IDLE", "300"))
+    db_pool_max_lifetime: float = float(os.getenv("DB_POOL_MAX_LIFETIME", "3600"))
+    # пинговать перед выдачей соединения, простоявшие в пуле дольше стольких секунд
+    db_pool_check_idle: float = float(os.getenv("DB_POOL_CHECK_IDLE", "30"))
+    db_pool_timeout: float = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+    # готовить запросы из app.queries на сервере (PREPARE) один раз на соединение;
+    # 0 - для pgbouncer в режиме транзакций
+    db_prepare_statements: bool = os.getenv("DB_PREPARE_STATEMENTS", "1") == "1"
+
+    # поиск регионов: "memory" - индекс в памяти, "db" - Postgres + pg_trgm
+    timezones_search_backend: str = os.getenv("TIMEZONES_SEARCH_BACKEND", "memory")
+    # минимальная триграммная похожесть для нечеткого поиска региона (0..1)
+    timezones_fuzzy_threshold: float = float(os.getenv("TIMEZONES_FUZZY_THRESHOLD", "0.35"))
 
 settings = Settings()
@@ -0,0 +1,182 @@
+import bisect
+import time
+from contextvars import ContextVar
+from typing import Callable
+
+# Минимальные метрики в текстовом формате Prometheus (без prometheus_client):
+# гистограммы и счётчики с метками, плюс "gauge"-функции, которые читаются при
+# выдаче /metrics. Всё живёт в памяти процесса, каждый воркер отдаёт свои значения.
+
+# границы бакетов в секундах: от 1 мс до 10 с
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _escape(v) -> str:
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple[str, ...], values: tuple, le: str | None = None) -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if le is not None:
+        parts.append(f'le="{le}"')
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt(v: float) -> str:
+    return repr(float(v)) if not float(v).is_integer() else str(int(v))
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = labels
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, *label_values) -> None:
+        self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def render(self) -> list[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for lv, v in self._values.items():
+            out.append(f"{self.name}{_labels(self.label_names, lv)} {_fmt(v)}")
+        return out
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = labels
+        self.buckets = tuple(buckets)
+        # метки -> [счётчики по бакетам (не накопленные) ..., +Inf], сумма
+        self._values: dict[tuple, tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, *label_values) -> None:
+        entry = self._values.get(label_values)
+        if entry is None:
+            entry = ([0] * (len(self.buckets) + 1), [0.0])
+            self._values[label_values] = entry
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1][0] += value
+
+    def render(self) -> list[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for lv, (counts, total) in self._values.items():
+            acc = 0
+            for le, c in zip(self.buckets, counts):
+                acc += c
+                out.append(f"{self.name}_bucket{_labels(self.label_names, lv, _fmt(le))} {acc}")
+            acc += counts[-1]
+            out.append(f"{self.name}_bucket{_labels(self.label_names, lv, '+Inf')} {acc}")
+            out.append(f"{self.name}_sum{_labels(self.label_names, lv)} {_fmt(total[0])}")
+            out.append(f"{self.name}_count{_labels(self.label_names, lv)} {acc}")
+        return out
+
+
+class Gauge:
+    # значение читается функцией в момент выдачи /metrics;
+    # с метками функция возвращает словарь {значения меток: значение}
+    def __init__(self, name: str, help: str, fn: Callable[[], float | dict | None], labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.label_names = labels
+
+    def render(self) -> list[str]:
+        value = self.fn()
+        if value is None:
+            return []
+        values = value if self.label_names else {(): value}
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        for lv, v in values.items():
+            out.append(f"{self.name}{_labels(self.label_names, lv)} {_fmt(v)}")
+        return out
+
+
+_registry: list[Counter | Histogram | Gauge] = []
+
+
+def register(metric):
+    _registry.append(metric)
+    return metric
+
+
+def render() -> str:
+    lines: list[str] = []
+    for m in _registry:
+        lines.extend(m.render())
+    return "\n".join(lines) + "\n"
+
+
+DB_QUERIES_TOTAL = register(Counter("db_queries_total", "SQL statements executed"))
+HTTP_LATENCY = register(
+    Histogram("http_request_duration_seconds", "HTTP request latency", ("method", "route", "status"))
+)
+DB_QUERIES = register(
+    Histogram("db_queries_per_request", "SQL statements executed per HTTP request", ("route",), COUNT_BUCKETS)
+)
+DB_QUERY_TIME = register(
+    Histogram("db_query_time_per_request_seconds", "Total SQL execution time per HTTP request", ("route",))
+)
+DB_POOL_WAIT = register(Histogram("db_pool_wait_seconds", "Time spent waiting for a pooled connection"))
+PASSWORD_HASH_TIME = register(
+    Histogram("password_hash_seconds", "PBKDF2 time including the wait for a hasher slot", ("op",))
+)
+
+
+class RequestStats:
+    # накопители для одного HTTP-запроса; объект общий для всех задач запроса
+    __slots__ = ("started", "sql_count", "sql_s", "pool_wait_s", "hash_s")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_s = 0.0
+        self.pool_wait_s = 0.0
+        self.hash_s = 0.0
+
+    def server_timing(self) -> str:
+        total = (time.perf_counter() - self.started) * 1000
+        parts = [f'db;dur={self.sql_s * 1000:.1f};desc="{self.sql_count} queries"']
+        if self.pool_wait_s:
+            parts.append(f"pool;dur={self.pool_wait_s * 1000:.1f}")
+        if self.hash_s:
+            parts.append(f"pbkdf2;dur={self.hash_s * 1000:.1f}")
+        parts.append(f"app;dur={total:.1f}")
+        return ", ".join(parts)
+
+
+_current: ContextVar[RequestStats | None] = ContextVar("request_stats", default=None)
+
+
+def start_request() -> tuple[RequestStats, object]:
+    stats = RequestStats()
+    return stats, _current.set(stats)
+
+
+def end_request(token) -> None:
+    _current.reset(token)
+
+
+def record_sql(seconds: float) -> None:
+    DB_QUERIES_TOTAL.inc()
+    stats = _current.get()
+    if stats is not None:
+        stats.sql_count += 1
+        stats.sql_s += seconds
+
+
+def record_pool_wait(seconds: float) -> None:
+    DB_POOL_WAIT.observe(seconds)
+    stats = _current.get()
+    if stats is not None:
+        stats.pool_wait_s += seconds
+
+
+def record_hash(op: str, seconds: float) -> None:
+    PASSWORD_HASH_TIME.observe(seconds, op)
+    stats = _current.get()
+    if stats is not None:
+        stats.hash_s += seconds
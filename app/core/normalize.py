@@ -0,0 +1,69 @@
+import re
+from functools import lru_cache
+
+# Единая нормализация названий регионов и разбор смещений из CSV.
+# Используется и загрузчиком справочника, и обработчиками запросов, поэтому
+# регулярки скомпилированы один раз, а norm_region запоминает последние входы.
+
+_CITY_RE = re.compile(r"\bг\.\b|\bг\b|\bгород\b")
+_PUNCT_RE = re.compile(r"[^a-zа-я0-9\s]+")
+_SPACES_RE = re.compile(r"\s+")
+_DIGIT_RE = re.compile(r"\d")
+_OFFSET_RE = re.compile(r"[-+]\s*\d+|\d+")
+
+# сколько разных входов помнить и какой длины строки вообще стоит кэшировать
+_NORM_CACHE_SIZE = 4096
+_NORM_CACHE_MAX_LEN = 200
+
+
+def norm_text(s: str) -> str:
+    # простая нормализация для сравнения: регистр, пробелы по краям, ё -> е
+    return (s or "").strip().lower().replace("ё", "е")
+
+
+def _norm_region(s: str) -> str:
+    s = norm_text(s)
+    # убираем г. / город
+    s = _CITY_RE.sub(" ", s)
+    # убираем знаки пунктуации
+    s = _PUNCT_RE.sub(" ", s)
+    return _SPACES_RE.sub(" ", s).strip()
+
+
+_norm_region_cached = lru_cache(maxsize=_NORM_CACHE_SIZE)(_norm_region)
+
+
+def norm_region(s: str) -> str:
+    # длинные строки (мусорный ввод) не кэшируем, чтобы не вытеснять частые запросы
+    if s is None:
+        return ""
+    if len(s) > _NORM_CACHE_MAX_LEN:
+        return _norm_region(s)
+    return _norm_region_cached(s)
+
+
+def norm_cache_stats() -> dict:
+    info = _norm_region_cached.cache_info()
+    return {"size": info.currsize, "hits": info.hits, "misses": info.misses}
+
+
+def parse_offset(value: str | None, strict: bool = False) -> int:
+    # "МСК+2", "UTC +5", "-1", "МСК" (= 0). strict=True - ошибка вместо 0 для нераспознанного значения
+    if value is None:
+        return 0
+    low = norm_text(str(value))
+    if not low:
+        return 0
+
+    if not _DIGIT_RE.search(low):
+        if ("мск" in low) or ("msk" in low) or ("mck" in low) or ("utc" in low):
+            return 0
+    else:
+        # ищем первое целое число со знаком +3, -2, 4
+        m = _OFFSET_RE.search(low)
+        if m:
+            return int(m.group(0).replace(" ", ""))
+
+    if strict:
+        raise ValueError(f"Cannot parse offset from value: {value!r}")
+    return 0
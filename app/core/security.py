@@ -1,12 +1,18 @@
+import asyncio
 import base64
 import hashlib
 import hmac
+import multiprocessing
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta, timezone
 
 import jwt
 
+from app.core.cache import TTLCache
 from app.core.config import settings
+from app.core.metrics import record_hash
 
 _PBKDF2_ITERATIONS = 210_000  
 
@@ -36,10 +42,110 @@ def verify_password(password: str, stored: str) -> bool:
         return False
 
 
-def create_access_token(user_id: int, role: str) -> str:
+def needs_rehash(stored: str) -> bool:
+    # хеш посчитан с другим числом итераций (например, до смены _PBKDF2_ITERATIONS)
+    try:
+        algo, iters, _, _ = stored.split("$", 3)
+        return algo != "pbkdf2_sha256" or int(iters) != _PBKDF2_ITERATIONS
+    except ValueError:
+        return True
+
+
+# --- PBKDF2 в отдельных процессах ---
+# Хеширование - чистый CPU и держит GIL, поэтому считаем его в пуле процессов.
+# Семафор ограничивает число одновременных вычислений, остальные ждут в очереди.
+
+_executor: ProcessPoolExecutor | None = None
+_slots: asyncio.Semaphore | None = None
+_stats = {"waiting": 0, "running": 0, "completed": 0}
+
+# кэш успешных проверок пароля: ключ - HMAC от (хеш, пароль) на случайном ключе процесса,
+# сам пароль в памяти не хранится
+_verify_cache = TTLCache(settings.password_verify_cache_size, settings.password_verify_cache_ttl)
+_verify_cache_key = os.urandom(32)
+
+
+def start_hasher() -> None:
+    global _executor, _slots
+    if _executor is None:
+        workers = settings.password_hash_workers or os.cpu_count() or 1
+        _executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+        _slots = asyncio.Semaphore(settings.password_hash_concurrency or workers)
+
+
+def stop_hasher() -> None:
+    global _executor, _slots
+    if _executor is not None:
+        _executor.shutdown(wait=True, cancel_futures=True)
+        _executor = None
+        _slots = None
+
+
+def hasher_stats() -> dict:
+    return {**_stats, "verify_cache": _verify_cache.stats()}
+
+
+async def _run_in_hasher(fn, *args):
+    t0 = time.perf_counter()
+    try:
+        return await _submit_to_hasher(fn, *args)
+    finally:
+        record_hash(fn.__name__, time.perf_counter() - t0)
+
+
+async def _submit_to_hasher(fn, *args):
+    if _executor is None:
+        # пул не запущен (скрипты, тесты) - хотя бы не блокируем event loop
+        return await asyncio.to_thread(fn, *args)
+
+    _stats["waiting"] += 1
+    try:
+        await _slots.acquire()
+    finally:
+        _stats["waiting"] -= 1
+
+    _stats["running"] += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_executor, fn, *args)
+    finally:
+        _stats["running"] -= 1
+        _stats["completed"] += 1
+        _slots.release()
+
+
+def _verify_cache_key_for(password: str, stored: str) -> bytes:
+    msg = stored.encode("utf-8") + b"\0" + password.encode("utf-8")
+    return hmac.new(_verify_cache_key, msg, hashlib.sha256).digest()
+
+
+async def hash_password_async(password: str) -> str:
+    return await _run_in_hasher(hash_password, password)
+
+
+async def verify_password_async(password: str, stored: str) -> bool:
+    key = _verify_cache_key_for(password, stored)
+    if _verify_cache.get(key):
+        return True
+
+    ok = await _run_in_hasher(verify_password, password, stored)
+
+    # кэшируем только успешные проверки, неверные пароли всегда пересчитываются
+    if ok:
+        _verify_cache.set(key, True)
+    return ok
+
+
+def create_access_token(user_id: int, role: str, full_name: str | None = None, email: str | None = None) -> str:
     now = datetime.now(timezone.utc)
     exp = now + timedelta(minutes=settings.jwt_expire_minutes)
     payload = {"sub": str(user_id), "role": role, "iat": int(now.timestamp()), "exp": int(exp.timestamp())}
+    # с этими полями get_current_user обходится без запроса к users
+    if settings.jwt_embed_user_claims and full_name is not None and email is not None:
+        payload["name"] = full_name
+        payload["email"] = email
     return jwt.encode(payload, settings.jwt_secret, algorithm="HS256")
 
 
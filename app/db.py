@@ -1,6 +1,121 @@
-import psycopg
+import time
+import weakref
+
+from psycopg import AsyncConnection, AsyncCursor
+from psycopg_pool import AsyncConnectionPool
+
 from app.core.config import settings
+from app.core.metrics import Gauge, record_pool_wait, record_sql, register
+
+_pool: AsyncConnectionPool | None = None
+
+# когда соединение вернули в пул: проверяем перед выдачей только долго простоявшие
+_idle_since: weakref.WeakKeyDictionary[AsyncConnection, float] = weakref.WeakKeyDictionary()
+
+
+class TimedCursor(AsyncCursor):
+    # Считает число и время SQL-запросов текущего HTTP-запроса (см. app.core.metrics).
+    # В pipeline-режиме execute только ставит запрос в очередь, время уходит в commit/fetch.
+
+    async def execute(self, query, params=None, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return await super().execute(query, params, **kwargs)
+        finally:
+            record_sql(time.perf_counter() - t0)
+
+    async def executemany(self, query, params_seq, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return await super().executemany(query, params_seq, **kwargs)
+        finally:
+            record_sql(time.perf_counter() - t0)
+
+
+def _connection_kwargs() -> dict:
+    kwargs = {}
+    if settings.metrics_enabled:
+        kwargs["cursor_factory"] = TimedCursor
+    if not settings.db_prepare_statements:
+        # без PREPARE вообще, в том числе автоматического после prepare_threshold вызовов
+        kwargs["prepare_threshold"] = None
+    return kwargs
+
+
+async def _mark_idle(conn) -> None:
+    _idle_since[conn] = time.monotonic()
+
+
+async def _check_idle(conn) -> None:
+    # Простоявшее дольше DB_POOL_CHECK_IDLE соединение могло умереть вместе с сервером
+    # (рестарт, failover) - пингуем его, и пул при ошибке выдаст другое. Свежие не трогаем,
+    # чтобы не платить round-trip на каждый запрос. Обычный курсор, а не TimedCursor:
+    # пинг не считается SQL-запросом в Server-Timing.
+    idle_since = _idle_since.pop(conn, None)
+    if idle_since is None or time.monotonic() - idle_since < settings.db_pool_check_idle:
+        return
+    await conn.set_autocommit(True)
+    try:
+        async with AsyncCursor(conn) as cur:
+            await cur.execute("")
+    finally:
+        if not conn.closed:
+            await conn.set_autocommit(False)
+
+
+async def open_pool() -> AsyncConnectionPool:
+    global _pool
+    if _pool is None:
+        _pool = AsyncConnectionPool(
+            settings.database_url,
+            min_size=settings.db_pool_min_size,
+            max_size=settings.db_pool_max_size,
+            max_idle=settings.db_pool_max_idle,
+            # старые соединения пул закрывает по max_lifetime/max_idle, сломанные
+            # отбрасывает при возврате, а простоявшие проверяет перед выдачей (_check_idle)
+            max_lifetime=settings.db_pool_max_lifetime,
+            check=_check_idle,
+            reset=_mark_idle,
+            timeout=settings.db_pool_timeout,
+            kwargs=_connection_kwargs(),
+            open=False,
+        )
+        await _pool.open(wait=True)
+    return _pool
+
+
+async def close_pool() -> None:
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+
+def get_pool() -> AsyncConnectionPool:
+    if _pool is None:
+        raise RuntimeError("Connection pool is not opened")
+    return _pool
+
+
+def pool_stats() -> dict:
+    if _pool is None:
+        return {}
+    return _pool.get_stats()
+
+
+def _pool_stat(name: str):
+    return lambda: pool_stats().get(name)
+
+
+register(Gauge("db_pool_size", "Open connections in the pool", _pool_stat("pool_size")))
+register(Gauge("db_pool_available", "Idle connections in the pool", _pool_stat("pool_available")))
+register(Gauge("db_pool_requests_waiting", "Requests waiting for a connection", _pool_stat("requests_waiting")))
+
 
-def get_conn():
-    with psycopg.connect(settings.database_url) as conn:
+async def get_conn():
+    # FastAPI кэширует зависимость в пределах запроса, поэтому все зависимости
+    # обработчика получают одно и то же соединение из пула
+    t0 = time.perf_counter()
+    async with get_pool().connection() as conn:
+        record_pool_wait(time.perf_counter() - t0)
         yield conn
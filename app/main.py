@@ -1,19 +1,126 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager, suppress
 from pathlib import Path
 from app.api.auth import router as auth_router
-import psycopg
 from fastapi import FastAPI
-from fastapi.responses import RedirectResponse
+from fastapi.responses import PlainTextResponse, RedirectResponse
 from fastapi.staticfiles import StaticFiles
+from starlette.routing import Mount
+from app.core import metrics
+from app.core.admission import admission_stats
 from app.core.config import settings
-from app.services.bootstrap import ensure_tables, ensure_timezones_loaded
-from app.api.timezones import router as timezones_router
+from app.core.normalize import norm_cache_stats
+from app.core.security import start_hasher, stop_hasher, hasher_stats
+from app.db import open_pool, close_pool, pool_stats
+from app.queries import query_stats
+from app.services.bootstrap import run_bootstrap
+from app.services.catalog import load_catalog
+from app.services.queue_events import hub, listen_queue_events
+from app.services.users import user_cache_stats
+from app.api.timezones import response_cache_stats, router as timezones_router
 from app.api.groups import router as groups_router
 
-app = FastAPI(title="Timezones Defense")
-
 BASE_DIR = Path(__file__).resolve().parent.parent
 FRONTEND_DIR = BASE_DIR / "frontend"
 
+CSV_PATH = BASE_DIR / "data" / "timezones.csv"
+SQL_PATH = BASE_DIR / "app" / "sql" / "create_tables.sql"
+MIGRATIONS_DIR = BASE_DIR / "app" / "sql" / "migrations"
+
+# логгер uvicorn, чтобы время старта было видно в его выводе без отдельной настройки logging
+log = logging.getLogger("uvicorn.error")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # один пул на всё приложение, его используют все роутеры через get_conn
+    start_hasher()
+    pool = await open_pool()
+    t0 = time.perf_counter()
+    async with pool.connection() as conn:
+        timings = await run_bootstrap(conn, SQL_PATH, MIGRATIONS_DIR, CSV_PATH)
+        # справочник часовых поясов держим в памяти, чтобы /timezones/* не ходили в БД
+        t = time.perf_counter()
+        await load_catalog(conn)
+        timings["catalog_ms"] = (time.perf_counter() - t) * 1000
+    timings["total_ms"] = (time.perf_counter() - t0) * 1000
+    log.info("Startup: %s", ", ".join(f"{k}={v:.1f}" if isinstance(v, float) else f"{k}={v}" for k, v in timings.items()))
+
+    # изменения очередей от всех воркеров приходят через LISTEN/NOTIFY
+    listener = asyncio.create_task(listen_queue_events())
+    yield
+    listener.cancel()
+    with suppress(asyncio.CancelledError):
+        await listener
+    await close_pool()
+    stop_hasher()
+
+
+def _route_label(scope) -> str:
+    # Шаблон пути ("/api/v1/groups/{group_id}/queue"), а не сам путь - иначе число меток не ограничено.
+    # route.path у вложенных роутеров без префикса, поэтому подставляем имена параметров в scope["path"].
+    route = scope.get("route")
+    if route is None:
+        # Mount (/ui, /static) не кладёт себя в scope["route"] - узнаём его по префиксу пути
+        path = scope["path"]
+        for mount in app.routes:
+            if isinstance(mount, Mount) and (path == mount.path or path.startswith(mount.path + "/")):
+                return mount.path
+        return "unmatched"
+    segments = scope["path"].split("/")
+    for name, value in scope.get("path_params", {}).items():
+        value = str(value)
+        if value in segments:
+            segments[segments.index(value)] = "{" + name + "}"
+    return "/".join(segments)
+
+
+# долгоживущие SSE-стримы: их длительность - время подписки, а не задержка ответа
+_UNTIMED_ROUTES = {"/api/v1/groups/{group_id}/queue/events"}
+
+
+class RequestMetricsMiddleware:
+    # Чистый ASGI-middleware (без BaseHTTPMiddleware, чтобы не мешать SSE-стримам):
+    # гистограммы по маршрутам и заголовок Server-Timing с временем SQL, ожидания пула и PBKDF2.
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats, token = metrics.start_request()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if settings.server_timing_enabled:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", stats.server_timing().encode("latin-1")))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            route = _route_label(scope)
+            if route not in _UNTIMED_ROUTES:
+                metrics.HTTP_LATENCY.observe(time.perf_counter() - stats.started, scope["method"], route, status)
+            metrics.DB_QUERIES.observe(stats.sql_count, route)
+            metrics.DB_QUERY_TIME.observe(stats.sql_s, route)
+            metrics.end_request(token)
+
+
+app = FastAPI(title="Timezones Defense", lifespan=lifespan)
+if settings.metrics_enabled:
+    app.add_middleware(RequestMetricsMiddleware)
+
 app.mount("/ui", StaticFiles(directory=str(FRONTEND_DIR), html=True), name="ui")
 app.mount("/static", StaticFiles(directory=str(FRONTEND_DIR / "static")), name="static")
 
@@ -21,15 +128,29 @@ app.include_router(auth_router, prefix="/api/v1")
 app.include_router(timezones_router, prefix="/api/v1")
 app.include_router(groups_router, prefix="/api/v1")
 
-CSV_PATH = BASE_DIR / "data" / "timezones.csv"
-SQL_PATH = BASE_DIR / "app" / "sql" / "create_tables.sql"
 
 @app.get("/")
-def root():
+async def root():
     return RedirectResponse(url="/ui/")
 
-@app.on_event("startup")
-def startup():
-    with psycopg.connect(settings.database_url) as conn:
-        ensure_tables(conn, SQL_PATH)
-        ensure_timezones_loaded(conn, CSV_PATH)
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    if not settings.metrics_enabled:
+        return PlainTextResponse("metrics are disabled\n", status_code=404)
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/api/v1/health")
+async def health():
+    return {
+        "status": "ok",
+        "db_pool": pool_stats(),
+        "password_hasher": hasher_stats(),
+        "user_cache": user_cache_stats(),
+        "queue_subscribers": hub.stats(),
+        "timezones_response_cache": response_cache_stats(),
+        "region_norm_cache": norm_cache_stats(),
+        "admission": admission_stats(),
+        "sql_statements": query_stats(),
+    }
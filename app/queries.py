@@ -0,0 +1,293 @@
+import time
+
+from app.core.config import settings
+from app.core.metrics import Histogram, register
+
+# Реестр горячих SQL-запросов. У каждого запроса есть имя; выполняется он через
+# run_query с prepare=True, поэтому psycopg готовит его на сервере один раз на
+# соединение пула (PREPARE при первом вызове), а дальше шлёт только параметры -
+# без повторного разбора и планирования. Для каждого запроса считаются число
+# вызовов и время (см. /health и db_statement_seconds в /metrics).
+#
+# DB_PREPARE_STATEMENTS=0 выключает подготовку совсем - например, за pgbouncer
+# в режиме транзакций, где соседние запросы могут уйти в разные соединения.
+
+DB_STATEMENT_TIME = register(
+    Histogram("db_statement_seconds", "Execution time of registered SQL statements", ("statement",))
+)
+
+
+class Query:
+    __slots__ = ("name", "sql", "calls", "total_s", "max_s")
+
+    def __init__(self, name: str, sql: str):
+        self.name = name
+        self.sql = sql
+        self.calls = 0
+        self.total_s = 0.0
+        self.max_s = 0.0
+
+    def record(self, seconds: float) -> None:
+        self.calls += 1
+        self.total_s += seconds
+        if seconds > self.max_s:
+            self.max_s = seconds
+        DB_STATEMENT_TIME.observe(seconds, self.name)
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "total_ms": round(self.total_s * 1000, 3),
+            "avg_ms": round(self.total_s * 1000 / self.calls, 3) if self.calls else 0.0,
+            "max_ms": round(self.max_s * 1000, 3),
+        }
+
+
+_registry: dict[str, Query] = {}
+
+
+def query(name: str, sql: str) -> Query:
+    if name in _registry:
+        raise ValueError(f"Query {name!r} is already registered")
+    q = Query(name, sql)
+    _registry[name] = q
+    return q
+
+
+async def run_query(cur, q: Query, params=None):
+    # В pipeline-режиме execute только ставит запрос в очередь, поэтому время там - без ответа сервера
+    t0 = time.perf_counter()
+    try:
+        return await cur.execute(q.sql, params, prepare=settings.db_prepare_statements)
+    finally:
+        q.record(time.perf_counter() - t0)
+
+
+def query_stats() -> dict:
+    return {name: q.stats() for name, q in _registry.items() if q.calls}
+
+
+# --- пользователи ---
+
+USER_BY_EMAIL = query(
+    "user_by_email",
+    "select id, full_name, email, role, password_hash from users where email=%s limit 1",
+)
+
+USER_BY_ID = query(
+    "user_by_id",
+    "select id, full_name, email, role from users where id=%s limit 1",
+)
+
+# --- группы ---
+
+GROUP_BY_CODE = query(
+    "group_by_code",
+    "select id, teacher_id, group_number, join_code from groups where join_code=%s limit 1",
+)
+
+GROUP_OWNED = query(
+    "group_owned",
+    "select 1 from groups where id=%s and teacher_id=%s limit 1",
+)
+
+# Один запрос: взять код из запаса и вставить группу.
+# ON CONFLICT по (teacher_id, group_number) отличает "такая группа уже есть"
+# (строка с кодом, но без группы) от пустого запаса (ни одной строки).
+# Код удаляется из запаса только вместе с созданной группой: used зависит от RETURNING ins,
+# а до commit код держит блокировка FOR UPDATE.
+GROUP_CREATE = query(
+    "group_create",
+    """
+    with code as (
+        select code from join_code_pool limit 1 for update skip locked
+    ),
+    ins as (
+        insert into groups (teacher_id, group_number, join_code)
+        select %s, %s, code from code
+        on conflict (teacher_id, group_number) do nothing
+        returning id, teacher_id, group_number, join_code, created_at
+    ),
+    used as (
+        delete from join_code_pool where code in (select join_code from ins)
+    )
+    select ins.id, ins.teacher_id, ins.group_number, ins.join_code, ins.created_at
+    from code
+    left join ins on true
+    """,
+)
+
+GROUPS_BY_TEACHER = query(
+    "groups_by_teacher",
+    """
+    select id, teacher_id, group_number, join_code, created_at
+    from groups
+    where teacher_id=%s
+    order by created_at desc
+    """,
+)
+
+GROUPS_BY_TEACHER_JSON = query(
+    "groups_by_teacher_json",
+    """
+    select '[' || coalesce(string_agg(row_to_json(item)::text, ',' order by g.created_at desc), '') || ']'
+    from groups g,
+    lateral (select g.id, g.teacher_id, g.group_number, g.join_code, g.created_at) item
+    where g.teacher_id=%s
+    """,
+)
+
+# Keyset-страницы по (created_at, id), см. groups_teacher_created_id_idx:
+# первая страница и страницы после курсора - два разных запроса, каждый со своим планом
+_GROUPS_PAGE_SQL = """
+    select id, teacher_id, group_number, join_code, created_at
+    from groups
+    where teacher_id=%s {where_after}
+    order by created_at desc, id desc
+    limit %s
+"""
+
+GROUPS_PAGE_FIRST = query("groups_page_first", _GROUPS_PAGE_SQL.format(where_after=""))
+GROUPS_PAGE_AFTER = query(
+    "groups_page_after",
+    _GROUPS_PAGE_SQL.format(where_after="and (created_at, id) < (%s, %s)"),
+)
+
+# --- участники и очередь ---
+
+PARTICIPANT_UPSERT = query(
+    "participant_upsert",
+    """
+    insert into participants (group_id, user_id, display_name, region, msk_offset_hours, position)
+    values (%s, %s, %s, %s, %s, %s)
+    on conflict (group_id, user_id) do update
+        set display_name=excluded.display_name,
+            region=excluded.region,
+            msk_offset_hours=excluded.msk_offset_hours,
+            position=excluded.position,
+            joined_at=now()
+    returning id, group_id, user_id, display_name, region, msk_offset_hours, joined_at, position
+    """,
+)
+
+QUEUE_NOTIFY = query("queue_notify", "select pg_notify(%s, %s)")
+
+# завершение сессии: строки группы лежат в одном HASH-разделе participants (миграция 008)
+QUEUE_CLEAR = query("queue_clear", "delete from participants where group_id=%s")
+
+# то же с переносом в participants_history: удалённые строки вставляются тем же запросом
+QUEUE_ARCHIVE = query(
+    "queue_archive",
+    """
+    with moved as (
+        delete from participants
+        where group_id=%s
+        returning id, group_id, user_id, display_name, region, msk_offset_hours, joined_at, position
+    )
+    insert into participants_history (id, group_id, user_id, display_name, region, msk_offset_hours, joined_at, position)
+    select id, group_id, user_id, display_name, region, msk_offset_hours, joined_at, position
+    from moved
+    """,
+)
+
+GROUP_OFFSETS = query(
+    "group_offsets",
+    """
+    select id, user_id, display_name, region, msk_offset_hours
+    from participants
+    where group_id=%s
+    order by joined_at, id
+    """,
+)
+
+# Участники группы с порядком очереди - единственное определение этого порядка,
+# его используют и полный список, и JSON, и страницы. Порядок считается на момент
+# чтения: чем позже сейчас у студента местное время, тем раньше он отвечает.
+# "Позже" отсчитывается от начала дня queue_day_start_hour (shift = час МСК - начало дня),
+# поэтому 00:30 идёт раньше 23:30. Внутри часа - FIFO по joined_at, id, в конце - общая очередь.
+# rank = 23 - корзина местного часа (24 - общая очередь), local_hour - текущий местный час
+_RANKED_QUEUE_SQL = """
+    select p.id, p.group_id, p.user_id, p.display_name, p.region, p.msk_offset_hours, p.joined_at,
+           case when p.msk_offset_hours is null then 24
+                else 23 - ((%(shift)s + p.msk_offset_hours) %% 24 + 24) %% 24 end as rank,
+           case when p.msk_offset_hours is null then 0
+                else ((%(h)s + p.msk_offset_hours) %% 24 + 24) %% 24 end as local_hour
+    from participants p
+    where p.group_id = %(g)s
+"""
+
+# row_to_json + string_agg дают компактный JSON (json_agg вставляет переводы строк)
+QUEUE_RANKED = query(
+    "queue_ranked",
+    f"""
+    select id, group_id, user_id, display_name, region, msk_offset_hours, joined_at, rank, local_hour
+    from ({_RANKED_QUEUE_SQL}) q
+    order by rank, joined_at, id
+    """,
+)
+
+QUEUE_JSON = query(
+    "queue_json",
+    f"""
+    select '[' || coalesce(string_agg(row_to_json(item)::text, ',' order by q.rank, q.joined_at, q.id), '') || ']'
+    from ({_RANKED_QUEUE_SQL}) q,
+    lateral (
+        select q.id, q.group_id, q.user_id, q.display_name, q.region, q.msk_offset_hours,
+               q.joined_at, q.local_hour as position
+    ) item
+    """,
+)
+
+_QUEUE_PAGE_SQL = f"""
+    select id, group_id, user_id, display_name, region, msk_offset_hours, joined_at, rank, local_hour
+    from ({_RANKED_QUEUE_SQL}) q
+    {{where_after}}
+    order by rank, joined_at, id
+    limit %(n)s
+"""
+
+QUEUE_PAGE_FIRST = query("queue_page_first", _QUEUE_PAGE_SQL.format(where_after=""))
+QUEUE_PAGE_AFTER = query(
+    "queue_page_after",
+    _QUEUE_PAGE_SQL.format(where_after="where (rank, joined_at, id) > (%(r)s, %(j)s, %(i)s)"),
+)
+
+# --- поиск регионов (backend=db) ---
+# like '%..%' обслуживается GIN-индексом pg_trgm
+
+SEARCH_REGIONS = query(
+    "search_regions",
+    """
+    select region, msk_offset_hours, utc_offset_hours, fias_code, region_norm
+    from timezones
+    where region_norm like %s
+    order by
+        case
+            when region_norm like %s then 0
+            when region_norm like %s then 1
+            else 2
+        end,
+        region
+    limit %s
+    """,
+)
+
+SEARCH_REGIONS_JSON = query(
+    "search_regions_json",
+    """
+    select '[' || coalesce(string_agg(row_to_json(item)::text, ',' order by t.rnk, t.region), '') || ']'
+    from (
+        select region, msk_offset_hours, utc_offset_hours, fias_code,
+            case
+                when region_norm like %s then 0
+                when region_norm like %s then 1
+                else 2
+            end as rnk
+        from timezones
+        where region_norm like %s
+        order by rnk, region
+        limit %s
+    ) t,
+    lateral (select t.region, t.msk_offset_hours, t.utc_offset_hours, t.fias_code) item
+    """,
+)
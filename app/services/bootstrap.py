@@ -1,45 +1,70 @@
 import csv
-import re
+import hashlib
+import time
 from pathlib import Path
 
-def norm_region(s: str) -> str:
-    s = (s or "").strip().lower().replace("ё", "е")
-    s = re.sub(r"\bг\.\b|\bг\b|\bгород\b", " ", s)
-    s = re.sub(r"[^a-zа-я0-9\s]+", " ", s)
-    s = re.sub(r"\s+", " ", s).strip()
-    return s
+from psycopg.errors import UndefinedTable
 
-def parse_offset(value: str) -> int:
-    v = (value or "").strip()
-    if not v:
-        return 0
-    low = v.lower()
-
-    if (("мск" in low) or ("msk" in low) or ("mck" in low)) and not re.search(r"\d", low):
-        return 0
-    if ("utc" in low) and not re.search(r"\d", low):
-        return 0
+from app.core.normalize import norm_region, parse_offset
 
-    m = re.search(r"[-+]\s*\d+|\d+", low)
-    if m:
-        return int(m.group(0).replace(" ", ""))
-    return 0
 
-def ensure_tables(conn, sql_path: Path) -> None:
+async def ensure_tables(conn, sql_path: Path) -> None:
     sql = sql_path.read_text(encoding="utf-8")
-    with conn.cursor() as cur:
-        cur.execute(sql)
-    conn.commit()
+    async with conn.cursor() as cur:
+        await cur.execute(sql)
+    await conn.commit()
 
-def ensure_timezones_loaded(conn, csv_path: Path) -> int:
-    with conn.cursor() as cur:
-        cur.execute("select count(*) from timezones")
-        count = cur.fetchone()[0]
+# имя источника в catalog_sources для data/timezones.csv
+_TIMEZONES_SOURCE = "timezones_csv"
 
-    if count and count > 0:
-        return 0
+# произвольный ключ pg_advisory_xact_lock, чтобы воркеры не накатывали миграции одновременно
+_MIGRATIONS_LOCK_ID = 7_240_101
+# сессионная блокировка на весь бутстрап (DDL + миграции + справочник)
+_BOOTSTRAP_LOCK_ID = 7_240_102
+
+
+def list_migrations(migrations_dir: Path) -> list[tuple[int, str, Path]]:
+    # файлы вида 001_name.sql, версия - числовой префикс
+    out = []
+    for path in sorted(migrations_dir.glob("*.sql")):
+        version, _, name = path.stem.partition("_")
+        out.append((int(version), name, path))
+    return out
+
+
+async def apply_migrations(conn, migrations_dir: Path) -> list[int]:
+    async with conn.cursor() as cur:
+        await cur.execute(
+            """
+            create table if not exists schema_migrations (
+                version int primary key,
+                name text not null,
+                applied_at timestamptz not null default now()
+            )
+            """
+        )
+        await cur.execute("select pg_advisory_xact_lock(%s)", (_MIGRATIONS_LOCK_ID,))
+        await cur.execute("select version from schema_migrations")
+        applied = {r[0] for r in await cur.fetchall()}
 
-    rows = []
+        done = []
+        for version, name, path in list_migrations(migrations_dir):
+            if version in applied:
+                continue
+            await cur.execute(path.read_text(encoding="utf-8"))
+            await cur.execute(
+                "insert into schema_migrations (version, name) values (%s, %s)",
+                (version, name),
+            )
+            done.append(version)
+
+    # все миграции - одна транзакция: либо применены целиком, либо ни одна
+    await conn.commit()
+    return done
+
+
+def iter_timezone_rows(csv_path: Path):
+    # (fias_code, region, region_norm, msk_offset_hours, utc_offset_hours) по строкам CSV
     with csv_path.open("r", encoding="utf-8-sig", newline="") as f:
         reader = csv.DictReader(f, delimiter=";")
         for r in reader:
@@ -51,20 +76,158 @@ def ensure_timezones_loaded(conn, csv_path: Path) -> int:
             msk = parse_offset(str(r.get("Номер часовой зоны (по МСК)", "0")))
             utc = parse_offset(str(r.get("Номер часовой зоны (по UTC)", "0")))
 
-            rows.append((fias, region, norm_region(region), msk, utc))
+            yield (fias, region, norm_region(region), msk, utc)
+
+
+def file_hash(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()
 
-    with conn.cursor() as cur:
-        cur.executemany(
+
+async def ensure_timezones_loaded(conn, csv_path: Path) -> int:
+    # Если CSV не менялся с прошлой загрузки - один запрос и выходим.
+    # Иначе: COPY файла во временную таблицу, сравнение с timezones по fias_code
+    # и применение только изменённых строк, всё в одной транзакции.
+    content_hash = file_hash(csv_path)
+
+    async with conn.cursor() as cur:
+        await cur.execute(
+            "select content_hash from catalog_sources where name=%s",
+            (_TIMEZONES_SOURCE,),
+        )
+        row = await cur.fetchone()
+    if row is not None and row[0] == content_hash:
+        await conn.rollback()
+        return 0
+
+    async with conn.cursor() as cur:
+        await cur.execute(
+            """
+            create temp table timezones_staging (
+                ord int not null,
+                fias_code text not null,
+                region text not null,
+                region_norm text not null,
+                msk_offset_hours int not null,
+                utc_offset_hours int not null
+            ) on commit drop
+            """
+        )
+        async with cur.copy(
+            "copy timezones_staging (ord, fias_code, region, region_norm, msk_offset_hours, utc_offset_hours) from stdin"
+        ) as copy:
+            for ord_, r in enumerate(iter_timezone_rows(csv_path)):
+                await copy.write_row((ord_, *r))
+
+        # при повторе fias_code в файле побеждает последняя строка, как и раньше
+        await cur.execute(
             """
             insert into timezones (fias_code, region, region_norm, msk_offset_hours, utc_offset_hours)
-            values (%s, %s, %s, %s, %s)
+            select distinct on (fias_code)
+                fias_code, region, region_norm, msk_offset_hours, utc_offset_hours
+            from timezones_staging
+            order by fias_code, ord desc
             on conflict (fias_code) do update set
                 region = excluded.region,
                 region_norm = excluded.region_norm,
                 msk_offset_hours = excluded.msk_offset_hours,
                 utc_offset_hours = excluded.utc_offset_hours
+            where (timezones.region, timezones.region_norm, timezones.msk_offset_hours, timezones.utc_offset_hours)
+                is distinct from
+                (excluded.region, excluded.region_norm, excluded.msk_offset_hours, excluded.utc_offset_hours)
+            """
+        )
+        changed = cur.rowcount
+
+        # регионы, которых больше нет в файле
+        await cur.execute(
+            """
+            delete from timezones t
+            where not exists (select 1 from timezones_staging s where s.fias_code = t.fias_code)
+            """
+        )
+        changed += cur.rowcount
+
+        await cur.execute(
+            """
+            insert into catalog_sources (name, content_hash) values (%s, %s)
+            on conflict (name) do update set content_hash = excluded.content_hash, loaded_at = now()
             """,
-            rows,
+            (_TIMEZONES_SOURCE, content_hash),
         )
-    conn.commit()
-    return len(rows)
+    await conn.commit()
+    return changed
+
+
+def bootstrap_fingerprint(sql_path: Path, migrations_dir: Path, csv_path: Path) -> str:
+    # меняется, только если поменялась схема, миграции или справочник
+    h = hashlib.sha256()
+    for path in [sql_path, *(p for _, _, p in list_migrations(migrations_dir)), csv_path]:
+        h.update(path.name.encode("utf-8"))
+        h.update(file_hash(path).encode("ascii"))
+    return h.hexdigest()
+
+
+async def _current_fingerprint(conn) -> str | None:
+    try:
+        async with conn.cursor() as cur:
+            await cur.execute("select fingerprint from schema_state")
+            row = await cur.fetchone()
+    except UndefinedTable:
+        row = None
+    await conn.rollback()
+    return row[0] if row else None
+
+
+async def run_bootstrap(conn, sql_path: Path, migrations_dir: Path, csv_path: Path) -> dict:
+    # Полный бутстрап выполняется один раз на выкладку: если отпечаток в schema_state
+    # совпадает с текущими файлами, воркеру достаточно одного select.
+    # Иначе первый воркер берёт advisory lock и делает всё сам, остальные ждут
+    # и после блокировки видят уже свежий отпечаток.
+    timings: dict[str, float] = {}
+    t0 = time.perf_counter()
+
+    fingerprint = bootstrap_fingerprint(sql_path, migrations_dir, csv_path)
+    current = await _current_fingerprint(conn)
+    timings["version_check_ms"] = (time.perf_counter() - t0) * 1000
+    if current == fingerprint:
+        timings["bootstrapped"] = False
+        return timings
+
+    await conn.execute("select pg_advisory_lock(%s)", (_BOOTSTRAP_LOCK_ID,))
+    await conn.commit()
+    try:
+        if await _current_fingerprint(conn) == fingerprint:
+            timings["bootstrapped"] = False
+            return timings
+
+        t = time.perf_counter()
+        await ensure_tables(conn, sql_path)
+        timings["ddl_ms"] = (time.perf_counter() - t) * 1000
+
+        t = time.perf_counter()
+        await apply_migrations(conn, migrations_dir)
+        timings["migrations_ms"] = (time.perf_counter() - t) * 1000
+
+        t = time.perf_counter()
+        timings["timezones_changed"] = await ensure_timezones_loaded(conn, csv_path)
+        timings["timezones_ms"] = (time.perf_counter() - t) * 1000
+
+        async with conn.cursor() as cur:
+            await cur.execute(
+                """
+                insert into schema_state (id, fingerprint) values (true, %s)
+                on conflict (id) do update set fingerprint = excluded.fingerprint, updated_at = now()
+                """,
+                (fingerprint,),
+            )
+        await conn.commit()
+        timings["bootstrapped"] = True
+        return timings
+    finally:
+        await conn.rollback()
+        await conn.execute("select pg_advisory_unlock(%s)", (_BOOTSTRAP_LOCK_ID,))
+        await conn.commit()
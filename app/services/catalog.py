@@ -0,0 +1,130 @@
+import hashlib
+from types import MappingProxyType
+
+from app.core.config import settings
+from app.core.normalize import norm_region
+from app.db import get_pool
+from app.services.search_index import RegionIndex
+from app.services.zones import MOSCOW, build_offset_tables, zone_for
+from app.timezones_service import TimezoneRow
+
+# доля от лучшей похожести, ниже которой нечеткие варианты не показываем
+_FUZZY_RELATIVE_CUTOFF = 0.8
+
+
+class TimezoneCatalog:
+    # Неизменяемый снимок таблицы timezones в памяти процесса.
+    # Строки отсортированы так же, как в прежних SQL-запросах: msk_offset_hours desc, region.
+
+    def __init__(self, rows: list[TimezoneRow]):
+        ordered = sorted(rows, key=lambda r: (-r.msk_offset_hours, r.region))
+        self.rows: tuple[TimezoneRow, ...] = tuple(ordered)
+        self.index = RegionIndex(ordered)
+
+        by_norm: dict[str, list[TimezoneRow]] = {}
+        for r in ordered:
+            by_norm.setdefault(r.region_norm, []).append(r)
+        self.by_norm = MappingProxyType({k: tuple(v) for k, v in by_norm.items()})
+        self.by_fias = MappingProxyType({r.fias_code: r for r in ordered})
+
+        # таблицы смещений для всех зон справочника считаются один раз при загрузке
+        zones = {MOSCOW, *(r.tz_name for r in ordered if r.tz_name)}
+        self.offset_tables = MappingProxyType(build_offset_tables(zones))
+
+        # версия содержимого: меняется только при изменении строк справочника (для ETag и кэшей)
+        h = hashlib.sha256()
+        for r in ordered:
+            h.update(f"{r.fias_code}\t{r.region}\t{r.msk_offset_hours}\t{r.utc_offset_hours}\n".encode("utf-8"))
+        self.version = h.hexdigest()[:16]
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def search(self, q: str, limit: int = 10) -> list[TimezoneRow]:
+        return self.index.search(q, limit)
+
+    def resolve(self, region: str, limit: int = 20) -> list[TimezoneRow]:
+        nr = norm_region(region)
+
+        # точное совпадение по нормализованному названию
+        exact = self.by_norm.get(nr)
+        if exact:
+            return list(exact[:limit])
+
+        # если ничего не нашли - пробуем contains
+        if not nr:
+            return []
+        out = []
+        for r in self.rows:
+            if nr in r.region_norm:
+                out.append(r)
+                if len(out) >= limit:
+                    break
+        if out:
+            return out
+
+        # опечатки: нечеткий поиск по триграммам, отбрасываем заметно менее похожие варианты
+        found = self.index.fuzzy(nr, limit, settings.timezones_fuzzy_threshold)
+        if not found:
+            return []
+        best = found[0][1]
+        return [r for r, score in found if score >= best * _FUZZY_RELATIVE_CUTOFF]
+
+    def find(self, region: str | None = None, fias_code: str | None = None) -> TimezoneRow | None:
+        if fias_code:
+            row = self.by_fias.get(fias_code)
+            if row is not None:
+                return row
+
+        if region:
+            rows = self.resolve(region, limit=1)
+            if rows:
+                return rows[0]
+
+        return None
+
+
+_catalog: TimezoneCatalog | None = None
+
+
+async def load_catalog(conn) -> TimezoneCatalog:
+    global _catalog
+    async with conn.cursor() as cur:
+        await cur.execute(
+            "select region, msk_offset_hours, utc_offset_hours, fias_code, region_norm from timezones"
+        )
+        rows = await cur.fetchall()
+
+    catalog = TimezoneCatalog(
+        [
+            TimezoneRow(
+                region=r[0],
+                msk_offset_hours=int(r[1]),
+                utc_offset_hours=int(r[2]),
+                fias_code=r[3],
+                region_norm=r[4],
+                tz_name=zone_for(r[3], int(r[2])),
+            )
+            for r in rows
+        ]
+    )
+    _catalog = catalog
+    return catalog
+
+
+def invalidate_catalog() -> None:
+    # следующий get_catalog() перечитает таблицу
+    global _catalog
+    _catalog = None
+
+
+async def reload_catalog() -> TimezoneCatalog:
+    async with get_pool().connection() as conn:
+        return await load_catalog(conn)
+
+
+async def get_catalog() -> TimezoneCatalog:
+    catalog = _catalog
+    if catalog is None:
+        catalog = await reload_catalog()
+    return catalog
@@ -1,9 +1,19 @@
 import secrets
 import string
+from datetime import datetime
 
-import psycopg
 from psycopg.errors import UniqueViolation
 
+from app.core.config import settings
+from app.queries import (
+    GROUP_CREATE,
+    GROUPS_BY_TEACHER,
+    GROUPS_BY_TEACHER_JSON,
+    GROUPS_PAGE_AFTER,
+    GROUPS_PAGE_FIRST,
+    run_query,
+)
+
 ALPHABET = string.ascii_uppercase + string.digits
 
 
@@ -11,64 +21,65 @@ def _generate_join_code(length: int = 8) -> str:
     return "".join(secrets.choice(ALPHABET) for _ in range(length))
 
 
-def create_group(conn, teacher_id: int, group_number: str) -> dict:
+async def refill_join_codes(conn, count: int | None = None) -> int:
+    # Запас заранее сгенерированных кодов: create_group берёт готовый код из
+    # join_code_pool в том же запросе, что и вставка группы. Коды, уже занятые
+    # группами, в запас не попадают.
+    count = count or settings.join_code_pool_refill
+    codes = list({_generate_join_code(8) for _ in range(count)})
+    async with conn.cursor() as cur:
+        await cur.execute(
+            """
+            insert into join_code_pool (code)
+            select c from unnest(%s::text[]) c
+            where not exists (select 1 from groups g where g.join_code = c)
+            on conflict do nothing
+            """,
+            (codes,),
+        )
+        added = cur.rowcount
+    await conn.commit()
+    return added
+
+
+async def create_group(conn, teacher_id: int, group_number: str) -> dict:
+    # Один запрос: забрать код из запаса и вставить группу (см. GROUP_CREATE).
     group_number = group_number.strip()
 
-    for _ in range(10):
-        join_code = _generate_join_code(8)
+    for _ in range(3):
         try:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """
-                    insert into groups (teacher_id, group_number, join_code)
-                    values (%s, %s, %s)
-                    returning id, teacher_id, group_number, join_code, created_at
-                    """,
-                    (teacher_id, group_number, join_code),
-                )
-                row = cur.fetchone()
-            conn.commit()
-            return {
-                "id": row[0],
-                "teacher_id": row[1],
-                "group_number": row[2],
-                "join_code": row[3],
-                "created_at": row[4].isoformat(),
-            }
+            async with conn.cursor() as cur:
+                async with conn.pipeline():
+                    await run_query(cur, GROUP_CREATE, (teacher_id, group_number))
+                    await conn.commit()
+                row = await cur.fetchone()
         except UniqueViolation:
-            conn.rollback()
-            if group_exists(conn, teacher_id, group_number):
-                raise ValueError("Group already exists")
+            # код из запаса успел занять кто-то другой - редкость, просто берём следующий
+            await conn.rollback()
+            continue
 
-    raise RuntimeError("Failed to generate unique join_code")
+        if row is None:
+            # запас кодов кончился
+            await refill_join_codes(conn)
+            continue
+        if row[0] is None:
+            raise ValueError("Group already exists")
 
+        return {
+            "id": row[0],
+            "teacher_id": row[1],
+            "group_number": row[2],
+            "join_code": row[3],
+            "created_at": row[4].isoformat(),
+        }
 
-def group_exists(conn, teacher_id: int, group_number: str) -> bool:
-    with conn.cursor() as cur:
-        cur.execute(
-            """
-            select 1
-            from groups
-            where teacher_id=%s and group_number=%s
-            limit 1
-            """,
-            (teacher_id, group_number),
-        )
-        return cur.fetchone() is not None
+    raise RuntimeError("Failed to generate unique join_code")
 
 
-def list_my_groups(conn, teacher_id: int) -> list[dict]:
-    with conn.cursor() as cur:
-        cur.execute(
-            """
-            select id, teacher_id, group_number, join_code, created_at
-            from groups
-            where teacher_id=%s
-            order by created_at desc
-            """,
-            (teacher_id,),
-        )
-        rows = cur.fetchall()
+async def list_my_groups(conn, teacher_id: int) -> list[dict]:
+    async with conn.cursor() as cur:
+        await run_query(cur, GROUPS_BY_TEACHER, (teacher_id,))
+        rows = await cur.fetchall()
 
     return [
         {
@@ -80,3 +91,45 @@ def list_my_groups(conn, teacher_id: int) -> list[dict]:
         }
         for r in rows
     ]
+
+
+async def list_my_groups_json(conn, teacher_id: int) -> bytes:
+    # ответ GET /groups/my целиком из Postgres (тот же порядок и поля, что у list_my_groups)
+    async with conn.cursor() as cur:
+        await run_query(cur, GROUPS_BY_TEACHER_JSON, (teacher_id,))
+        row = await cur.fetchone()
+    return row[0].encode("utf-8")
+
+
+async def list_my_groups_page(
+    conn, teacher_id: int, limit: int, after: dict | None = None
+) -> tuple[list[dict], dict | None]:
+    # Keyset-пагинация по (created_at, id) от новых к старым, см. groups_teacher_created_id_idx.
+    # Возвращает (группы, ключ последней группы или None, если это последняя страница).
+    try:
+        key = (datetime.fromisoformat(after["c"]), int(after["i"])) if after else None
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("Invalid cursor")
+
+    async with conn.cursor() as cur:
+        if key:
+            await run_query(cur, GROUPS_PAGE_AFTER, (teacher_id, *key, limit + 1))
+        else:
+            await run_query(cur, GROUPS_PAGE_FIRST, (teacher_id, limit + 1))
+        rows = await cur.fetchall()
+
+    more = len(rows) > limit
+    rows = rows[:limit]
+    items = [
+        {
+            "id": r[0],
+            "teacher_id": r[1],
+            "group_number": r[2],
+            "join_code": r[3],
+            "created_at": r[4].isoformat(),
+        }
+        for r in rows
+    ]
+    if not more:
+        return items, None
+    return items, {"c": rows[-1][4].isoformat(), "i": rows[-1][0]}
@@ -1,20 +1,37 @@
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 
+from app.core.config import settings
+from app.queries import (
+    GROUP_BY_CODE,
+    GROUP_OFFSETS,
+    PARTICIPANT_UPSERT,
+    QUEUE_ARCHIVE,
+    QUEUE_CLEAR,
+    QUEUE_JSON,
+    QUEUE_PAGE_AFTER,
+    QUEUE_PAGE_FIRST,
+    QUEUE_RANKED,
+    run_query,
+)
+from app.services.queue_events import notify_queue
+from app.services.zones import moscow_offset_hours
 
-def get_group_by_code(conn, join_code: str):
-    with conn.cursor() as cur:
-        cur.execute(
-            "select id, teacher_id, group_number, join_code from groups where join_code=%s limit 1",
-            (join_code.strip().upper(),),
-        )
-        return cur.fetchone()
+
+async def get_group_by_code(conn, join_code: str):
+    async with conn.cursor() as cur:
+        await run_query(cur, GROUP_BY_CODE, (join_code.strip().upper(),))
+        return await cur.fetchone()
+
+
+def _msk_hour(now_utc: datetime | None = None) -> int:
+    # текущий час по Москве; смещение МСК берётся из таблицы переходов Europe/Moscow
+    now_utc = now_utc or datetime.now(timezone.utc)
+    return (now_utc + timedelta(hours=moscow_offset_hours(now_utc))).hour
 
 
-def local_hour_from_msk_offset(msk_offset_hours: int) -> int:
+def local_hour_from_msk_offset(msk_offset_hours: int, now_utc: datetime | None = None) -> int:
     # local_time = now_msk + offset
-    now_utc = datetime.now(timezone.utc)
-    now_msk_hour = (now_utc.hour + 3) % 24  # МСК = UTC+3
-    return (now_msk_hour + int(msk_offset_hours)) % 24
+    return (_msk_hour(now_utc) + int(msk_offset_hours)) % 24
 
 
 def calc_position(msk_offset_hours: int | None) -> int:
@@ -25,7 +42,7 @@ def calc_position(msk_offset_hours: int | None) -> int:
     return local_hour_from_msk_offset(msk_offset_hours)
 
 
-def upsert_participant(
+async def upsert_participant(
     conn,
     group_id: int,
     user_id: int,
@@ -35,64 +52,242 @@ def upsert_participant(
 ) -> dict:
     position = calc_position(msk_offset_hours)
 
-    with conn.cursor() as cur:
-        cur.execute(
-            """
-            insert into participants (group_id, user_id, display_name, region, msk_offset_hours, position)
-            values (%s, %s, %s, %s, %s, %s)
-            on conflict (group_id, user_id) do update
-                set display_name=excluded.display_name,
-                    region=excluded.region,
-                    msk_offset_hours=excluded.msk_offset_hours,
-                    position=excluded.position,
-                    joined_at=now()
-            returning id, group_id, user_id, display_name, region, msk_offset_hours, joined_at, position
-            """,
-            (group_id, user_id, display_name, region, msk_offset_hours, position),
+    async with conn.cursor() as cur:
+        await run_query(
+            cur, PARTICIPANT_UPSERT, (group_id, user_id, display_name, region, msk_offset_hours, position)
         )
-        row = cur.fetchone()
+        row = await cur.fetchone()
+
+        item = {
+            "id": row[0],
+            "group_id": row[1],
+            "user_id": row[2],
+            "display_name": row[3],
+            "region": row[4],
+            "msk_offset_hours": row[5],
+            "joined_at": row[6].isoformat(),
+            "position": row[7],
+        }
+        await notify_queue(cur, group_id, "upsert", item)
+
+    await conn.commit()
+    return item
+
+
+async def upsert_participants_batch(conn, group_id: int, items: list[dict]) -> list[dict | None]:
+    # Массовая запись: один INSERT ... SELECT FROM unnest(...) на весь список.
+    # items: display_name, email (может быть None), region, msk_offset_hours.
+    # user_id находим по email в том же запросе; без совпадения запись остаётся без пользователя
+    # и при повторном импорте находится по display_name (participants_group_anon_name_uq).
+    # Возвращает участника для каждого элемента items в том же порядке
+    # (None - строка перекрыта более поздней строкой того же пользователя).
+    if not items:
+        return []
+
+    # email сравниваем точно, как get_user_by_email, чтобы работал уникальный индекс users.email
+    emails = [(it.get("email") or "").strip() or None for it in items]
+
+    async with conn.cursor() as cur:
+        # pipeline: событие и вставка уходят на сервер одним пакетом
+        async with conn.pipeline():
+            # одно событие на всю пачку: подписчики перечитают очередь целиком
+            await notify_queue(cur, group_id, "resync")
+            await cur.execute(
+                """
+                with input as (
+                    select *
+                    from unnest(%s::text[], %s::text[], %s::text[], %s::int[], %s::int[])
+                        with ordinality as t(display_name, email, region, msk_offset_hours, position, ord)
+                ),
+                resolved as (
+                    -- при повторе пользователя (или имени без пользователя) в списке побеждает
+                    -- последняя строка: ON CONFLICT не может обновить одну строку дважды за запрос
+                    select distinct on (coalesce(u.id::text, 'name:' || i.display_name))
+                        u.id as user_id, i.display_name, i.region, i.msk_offset_hours, i.position, i.ord
+                    from input i
+                    left join users u on u.email = i.email
+                    order by coalesce(u.id::text, 'name:' || i.display_name), i.ord desc
+                ),
+                numbered as (
+                    -- id выдаём заранее, чтобы сопоставить вставленные строки с входными;
+                    -- при конфликте строка сохраняет старый id и находится по user_id
+                    -- (без пользователя - по display_name)
+                    select nextval(pg_get_serial_sequence('participants', 'id')) as new_id, *
+                    from resolved
+                ),
+                ins_user as (
+                    insert into participants (id, group_id, user_id, display_name, region, msk_offset_hours, position)
+                    select new_id, %s, user_id, display_name, region, msk_offset_hours, position
+                    from numbered
+                    where user_id is not null
+                    order by ord
+                    on conflict (group_id, user_id) do update
+                        set display_name=excluded.display_name,
+                            region=excluded.region,
+                            msk_offset_hours=excluded.msk_offset_hours,
+                            position=excluded.position,
+                            joined_at=now()
+                    returning id, group_id, user_id, display_name, region, msk_offset_hours, joined_at, position
+                ),
+                ins_anon as (
+                    -- NULL в user_id не конфликтует сам с собой, поэтому ключ здесь - имя
+                    insert into participants (id, group_id, user_id, display_name, region, msk_offset_hours, position)
+                    select new_id, %s, null, display_name, region, msk_offset_hours, position
+                    from numbered
+                    where user_id is null
+                    order by ord
+                    on conflict (group_id, display_name) where user_id is null do update
+                        set region=excluded.region,
+                            msk_offset_hours=excluded.msk_offset_hours,
+                            position=excluded.position,
+                            joined_at=now()
+                    returning id, group_id, user_id, display_name, region, msk_offset_hours, joined_at, position
+                ),
+                ins as (
+                    select * from ins_user
+                    union all
+                    select * from ins_anon
+                )
+                select r.ord, ins.id, ins.group_id, ins.user_id, ins.display_name, ins.region,
+                       ins.msk_offset_hours, ins.joined_at, ins.position
+                from ins
+                join numbered r
+                    on r.new_id = ins.id
+                    or r.user_id = ins.user_id
+                    or (r.user_id is null and ins.user_id is null and r.display_name = ins.display_name)
+                order by r.ord
+                """,
+                (
+                    [it["display_name"] for it in items],
+                    emails,
+                    [it.get("region") for it in items],
+                    [it.get("msk_offset_hours") for it in items],
+                    [calc_position(it.get("msk_offset_hours")) for it in items],
+                    group_id,
+                    group_id,
+                ),
+            )
+            rows = await cur.fetchall()
+
+    await conn.commit()
+
+    out: list[dict | None] = [None] * len(items)
+    for r in rows:
+        out[r[0] - 1] = {
+            "id": r[1],
+            "group_id": r[2],
+            "user_id": r[3],
+            "display_name": r[4],
+            "region": r[5],
+            "msk_offset_hours": r[6],
+            "joined_at": r[7].isoformat(),
+            "position": r[8],
+        }
+    return out
+
+
+async def clear_queue(conn, group_id: int, archive: bool | None = None) -> int:
+    # Один DELETE по индексу внутри HASH-раздела группы (миграция 008); мёртвые строки
+    # остаются только в этом разделе. С archive удалённые строки тем же запросом
+    # переносятся в participants_history.
+    archive = settings.queue_finish_archive if archive is None else archive
+    async with conn.cursor() as cur:
+        await run_query(cur, QUEUE_ARCHIVE if archive else QUEUE_CLEAR, (group_id,))
+        deleted = cur.rowcount
+        await notify_queue(cur, group_id, "clear")
 
-    conn.commit()
+    await conn.commit()
+    return deleted
+
+
+def _ranked_params(group_id: int, msk_hour: int) -> dict:
+    # параметры _RANKED_QUEUE_SQL (app.queries): там и считается порядок очереди
+    return {"g": group_id, "h": msk_hour, "shift": msk_hour - settings.queue_day_start_hour}
+
+
+async def list_queue(conn, group_id: int, now_utc: datetime | None = None) -> list[dict]:
+    # position в ответе - текущий местный час студента (0 для общей очереди)
+    async with conn.cursor() as cur:
+        await run_query(cur, QUEUE_RANKED, _ranked_params(group_id, _msk_hour(now_utc)))
+        rows = await cur.fetchall()
+    return [_queue_item(r) for r in rows]
+
+
+async def list_queue_json(conn, group_id: int, now_utc: datetime | None = None) -> bytes:
+    # Тот же ответ, что и GET /groups/{id}/queue, но массив queue собирается в Postgres:
+    # без dict на строку в Python и без повторной сериализации в FastAPI.
+    async with conn.cursor() as cur:
+        await run_query(cur, QUEUE_JSON, _ranked_params(group_id, _msk_hour(now_utc)))
+        row = await cur.fetchone()
+
+    head = f'{{"group_id":{group_id},"day_start_hour":{settings.queue_day_start_hour},"queue":'
+    return head.encode("utf-8") + row[0].encode("utf-8") + b"}"
+
+
+def _queue_item(r) -> dict:
     return {
-        "id": row[0],
-        "group_id": row[1],
-        "user_id": row[2],
-        "display_name": row[3],
-        "region": row[4],
-        "msk_offset_hours": row[5],
-        "joined_at": row[6].isoformat(),
-        "position": row[7],
+        "id": r[0],
+        "group_id": r[1],
+        "user_id": r[2],
+        "display_name": r[3],
+        "region": r[4],
+        "msk_offset_hours": r[5],
+        "joined_at": r[6].isoformat(),
+        "position": r[8],
     }
 
 
-def list_queue(conn, group_id: int) -> list[dict]:
-    # Сначала те, у кого position > 0 (с учетом, что есть регион), по убыванию position,
-    # потом общая очередь (где position=0) по joined_at
-    with conn.cursor() as cur:
-        cur.execute(
-            """
-            select id, group_id, user_id, display_name, region, msk_offset_hours, joined_at, position
-            from participants
-            where group_id=%s
-            order by
-                case when position > 0 then 0 else 1 end,
-                position desc,
-                joined_at asc
-            """,
-            (group_id,),
+async def list_queue_page(
+    conn,
+    group_id: int,
+    limit: int,
+    after: dict | None = None,
+    now_utc: datetime | None = None,
+) -> tuple[list[dict], dict | None]:
+    # Keyset-пагинация в том же порядке, что и list_queue:
+    # по rank, дальше joined_at, id (см. QUEUE_PAGE_FIRST в app.queries).
+    # Час по МСК фиксируется в курсоре первой страницы, чтобы страницы не "поехали"
+    # при смене часа. Возвращает (строки, ключ последней строки или None, если это конец).
+    try:
+        msk_hour = int(after["h"]) % 24 if after else _msk_hour(now_utc)
+        key = (int(after["r"]), datetime.fromisoformat(after["j"]), int(after["i"])) if after else None
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("Invalid cursor")
+
+    async with conn.cursor() as cur:
+        await run_query(
+            cur,
+            QUEUE_PAGE_AFTER if key else QUEUE_PAGE_FIRST,
+            {
+                **_ranked_params(group_id, msk_hour),
+                "r": key and key[0],
+                "j": key and key[1],
+                "i": key and key[2],
+                "n": limit + 1,
+            },
         )
-        rows = cur.fetchall()
+        rows = await cur.fetchall()
+
+    if len(rows) <= limit:
+        return [_queue_item(r) for r in rows], None
+    rows = rows[:limit]
+    last = rows[-1]
+    return [_queue_item(r) for r in rows], {"h": msk_hour, "r": last[7], "j": last[6].isoformat(), "i": last[0]}
+
+
+async def list_group_offsets(conn, group_id: int) -> list[dict]:
+    # только то, что нужно для часов студентов: без сортировки очереди
+    async with conn.cursor() as cur:
+        await run_query(cur, GROUP_OFFSETS, (group_id,))
+        rows = await cur.fetchall()
 
     return [
         {
             "id": r[0],
-            "group_id": r[1],
-            "user_id": r[2],
-            "display_name": r[3],
-            "region": r[4],
-            "msk_offset_hours": r[5],
-            "joined_at": r[6].isoformat(),
-            "position": r[7],
+            "user_id": r[1],
+            "display_name": r[2],
+            "region": r[3],
+            "msk_offset_hours": r[4],
         }
         for r in rows
     ]
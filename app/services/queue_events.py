@@ -0,0 +1,94 @@
+import asyncio
+import json
+import logging
+
+import psycopg
+
+from app.core.config import settings
+from app.queries import QUEUE_NOTIFY, run_query
+
+# Изменения очереди рассылаются через LISTEN/NOTIFY, поэтому событие, записанное
+# одним воркером uvicorn, доходит до подписчиков во всех остальных воркерах.
+CHANNEL = "queue_events"
+
+# сколько событий держим для медленного клиента, прежде чем попросить его перечитать очередь
+_SUBSCRIBER_BUFFER = 100
+
+log = logging.getLogger(__name__)
+
+
+async def notify_queue(cur, group_id: int, op: str, participant: dict | None = None) -> None:
+    # вызывается внутри транзакции изменения: Postgres доставит событие только после commit
+    payload = {"group_id": group_id, "op": op}
+    if participant is not None:
+        payload["participant"] = participant
+    await run_query(cur, QUEUE_NOTIFY, (CHANNEL, json.dumps(payload, ensure_ascii=False)))
+
+
+class QueueHub:
+    # Подписчики текущего процесса, сгруппированные по group_id.
+
+    def __init__(self):
+        self._subscribers: dict[int, set[asyncio.Queue]] = {}
+
+    def subscribe(self, group_id: int) -> asyncio.Queue:
+        q: asyncio.Queue = asyncio.Queue(maxsize=_SUBSCRIBER_BUFFER)
+        self._subscribers.setdefault(group_id, set()).add(q)
+        return q
+
+    def unsubscribe(self, group_id: int, q: asyncio.Queue) -> None:
+        subs = self._subscribers.get(group_id)
+        if subs is None:
+            return
+        subs.discard(q)
+        if not subs:
+            del self._subscribers[group_id]
+
+    def publish(self, event: dict) -> None:
+        for q in self._subscribers.get(event.get("group_id"), ()):
+            try:
+                q.put_nowait(event)
+            except asyncio.QueueFull:
+                # клиент не успевает - выбрасываем накопленное и просим перечитать очередь целиком
+                while not q.empty():
+                    q.get_nowait()
+                q.put_nowait({"group_id": event["group_id"], "op": "resync"})
+
+    def resync_all(self) -> None:
+        # после переподключения к БД события могли потеряться
+        for group_id in list(self._subscribers):
+            self.publish({"group_id": group_id, "op": "resync"})
+
+    def stats(self) -> dict:
+        return {
+            "groups": len(self._subscribers),
+            "subscribers": sum(len(s) for s in self._subscribers.values()),
+        }
+
+
+hub = QueueHub()
+
+
+async def listen_queue_events() -> None:
+    # отдельное соединение вне пула: LISTEN держит его всё время работы процесса
+    delay = 1.0
+    first = True
+    while True:
+        try:
+            async with await psycopg.AsyncConnection.connect(settings.database_url, autocommit=True) as conn:
+                await conn.execute(f"LISTEN {CHANNEL}")
+                if not first:
+                    hub.resync_all()
+                first = False
+                delay = 1.0
+                async for n in conn.notifies():
+                    try:
+                        hub.publish(json.loads(n.payload))
+                    except ValueError:
+                        log.warning("Bad queue event payload: %r", n.payload)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            log.exception("Queue events listener failed, reconnecting in %.0f s", delay)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30.0)
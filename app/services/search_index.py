@@ -0,0 +1,155 @@
+from app.core.normalize import norm_region
+from app.queries import SEARCH_REGIONS, SEARCH_REGIONS_JSON, run_query
+from app.timezones_service import TimezoneRow
+
+# максимальная длина n-граммы в индексе; более короткие запросы ищутся по 1- и 2-граммам
+_MAX_GRAM = 3
+
+
+def _grams(s: str, n: int) -> set[str]:
+    return {s[i : i + n] for i in range(len(s) - n + 1)}
+
+
+def trigrams(s: str) -> set[str]:
+    # как в pg_trgm: каждое слово дополняется двумя пробелами слева и одним справа
+    out = set()
+    for w in s.split():
+        padded = f"  {w} "
+        out.update(_grams(padded, 3))
+    return out
+
+
+def _rank(name: str, nq: str) -> int | None:
+    # 0 - название начинается с запроса, 1 - с запроса начинается слово, 2 - подстрока
+    pos = name.find(nq)
+    if pos < 0:
+        return None
+    if pos == 0:
+        return 0
+    if f" {nq}" in name:
+        return 1
+    return 2
+
+
+class RegionIndex:
+    # Инвертированный индекс n-грамм по нормализованным названиям регионов.
+    # Кандидаты - пересечение списков по всем n-граммам запроса,
+    # затем точная проверка подстроки и ранжирование.
+
+    def __init__(self, rows: list[TimezoneRow]):
+        self._rows = tuple(sorted(rows, key=lambda r: r.region))
+
+        postings: dict[str, set[int]] = {}
+        for idx, r in enumerate(self._rows):
+            for n in range(1, _MAX_GRAM + 1):
+                for g in _grams(r.region_norm, n):
+                    postings.setdefault(g, set()).add(idx)
+        self._postings = {g: frozenset(ids) for g, ids in postings.items()}
+
+        # для нечеткого поиска сравниваем запрос и с названием целиком, и с каждым его словом
+        # ("свердловск" похож на слово "свердловская", но не на "свердловская область")
+        self._targets: list[tuple[int, int]] = []  # (индекс строки, число триграмм)
+        trgm_postings: dict[str, list[int]] = {}
+        for idx, r in enumerate(self._rows):
+            words = r.region_norm.split()
+            variants = [r.region_norm] + (words if len(words) > 1 else [])
+            for v in variants:
+                tset = trigrams(v)
+                if not tset:
+                    continue
+                tid = len(self._targets)
+                self._targets.append((idx, len(tset)))
+                for g in tset:
+                    trgm_postings.setdefault(g, []).append(tid)
+        self._trgm_postings = {g: tuple(ids) for g, ids in trgm_postings.items()}
+
+    def _candidates(self, nq: str) -> set[int]:
+        n = min(_MAX_GRAM, len(nq))
+        lists = []
+        for g in _grams(nq, n):
+            ids = self._postings.get(g)
+            if not ids:
+                return set()
+            lists.append(ids)
+
+        lists.sort(key=len)
+        out = set(lists[0])
+        for ids in lists[1:]:
+            out &= ids
+            if not out:
+                break
+        return out
+
+    def search(self, q: str, limit: int = 10) -> list[TimezoneRow]:
+        nq = norm_region(q)
+        if not nq:
+            return []
+
+        ranked = []
+        for idx in self._candidates(nq):
+            rank = _rank(self._rows[idx].region_norm, nq)
+            if rank is not None:
+                ranked.append((rank, idx))
+
+        # индексы уже упорядочены по region, поэтому сортируем по (rank, idx)
+        ranked.sort()
+        return [self._rows[idx] for _, idx in ranked[:limit]]
+
+    def fuzzy(self, q: str, limit: int = 5, threshold: float = 0.4) -> list[tuple[TimezoneRow, float]]:
+        # Триграммная похожесть (Жаккар, как similarity() в pg_trgm).
+        # Считаем общие триграммы только для тех вариантов, что встречаются
+        # в списках триграмм запроса, - остальные строки даже не просматриваются.
+        qt = trigrams(norm_region(q))
+        if not qt:
+            return []
+
+        shared: dict[int, int] = {}
+        for g in qt:
+            for tid in self._trgm_postings.get(g, ()):
+                shared[tid] = shared.get(tid, 0) + 1
+
+        best: dict[int, float] = {}
+        qn = len(qt)
+        for tid, common in shared.items():
+            idx, tn = self._targets[tid]
+            score = common / (qn + tn - common)
+            if score >= threshold and score > best.get(idx, 0.0):
+                best[idx] = score
+
+        ranked = sorted(best.items(), key=lambda x: (-x[1], x[0]))
+        return [(self._rows[idx], score) for idx, score in ranked[:limit]]
+
+
+async def search_regions_db(conn, q: str, limit: int = 10) -> list[TimezoneRow]:
+    # тот же поиск на стороне Postgres (SEARCH_REGIONS, GIN-индекс pg_trgm).
+    # после norm_region в запросе нет символов % и _, экранировать нечего
+    nq = norm_region(q)
+    if not nq:
+        return []
+
+    async with conn.cursor() as cur:
+        await run_query(cur, SEARCH_REGIONS, (f"%{nq}%", f"{nq}%", f"% {nq}%", limit))
+        rows = await cur.fetchall()
+
+    return [
+        TimezoneRow(
+            region=r[0],
+            msk_offset_hours=int(r[1]),
+            utc_offset_hours=int(r[2]),
+            fias_code=r[3],
+            region_norm=r[4],
+        )
+        for r in rows
+    ]
+
+
+async def search_regions_db_json(conn, q: str, limit: int = 10) -> bytes:
+    # то же, что search_regions_db, но готовый JSON-ответ /timezones/search из Postgres
+    nq = norm_region(q)
+    if not nq:
+        return b"[]"
+
+    async with conn.cursor() as cur:
+        await run_query(cur, SEARCH_REGIONS_JSON, (f"{nq}%", f"% {nq}%", f"%{nq}%", limit))
+        row = await cur.fetchone()
+    return row[0].encode("utf-8")
@@ -1,27 +1,40 @@
-from app.core.security import hash_password
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.security import hash_password_async
+from app.queries import USER_BY_EMAIL, USER_BY_ID, run_query
 
-def get_user_by_email(conn, email: str):
-    with conn.cursor() as cur:
-        cur.execute(
-            "select id, full_name, email, role, password_hash from users where email=%s limit 1",
-            (email,),
-        )
-        return cur.fetchone()
+# имя, email и роль в приложении не меняются, поэтому записи устаревают только по TTL
+_user_cache = TTLCache(settings.user_cache_size, settings.user_cache_ttl)
 
+async def get_user_by_email(conn, email: str):
+    async with conn.cursor() as cur:
+        await run_query(cur, USER_BY_EMAIL, (email,))
+        return await cur.fetchone()
 
-def get_user_by_id(conn, user_id: int):
-    with conn.cursor() as cur:
-        cur.execute(
-            "select id, full_name, email, role from users where id=%s limit 1",
-            (user_id,),
-        )
-        return cur.fetchone()
+
+async def get_user_by_id(conn, user_id: int):
+    async with conn.cursor() as cur:
+        await run_query(cur, USER_BY_ID, (user_id,))
+        return await cur.fetchone()
+
+
+async def get_user_cached(conn, user_id: int):
+    user = _user_cache.get(user_id)
+    if user is None:
+        user = await get_user_by_id(conn, user_id)
+        if user is not None:
+            _user_cache.set(user_id, user)
+    return user
 
 
-def create_user(conn, full_name: str, email: str, role: str, password: str):
-    pwd_hash = hash_password(password)
-    with conn.cursor() as cur:
-        cur.execute(
+def user_cache_stats() -> dict:
+    return _user_cache.stats()
+
+
+async def create_user(conn, full_name: str, email: str, role: str, password: str):
+    pwd_hash = await hash_password_async(password)
+    async with conn.cursor() as cur:
+        await cur.execute(
             """
             insert into users (full_name, email, role, password_hash)
             values (%s, %s, %s, %s)
@@ -29,6 +42,15 @@ def create_user(conn, full_name: str, email: str, role: str, password: str):
             """,
             (full_name, email, role, pwd_hash),
         )
-        row = cur.fetchone()
-    conn.commit()
+        row = await cur.fetchone()
+    await conn.commit()
     return row
+
+
+async def update_password_hash(conn, user_id: int, password_hash: str) -> None:
+    async with conn.cursor() as cur:
+        await cur.execute(
+            "update users set password_hash=%s where id=%s",
+            (password_hash, user_id),
+        )
+    await conn.commit()
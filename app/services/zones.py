@@ -0,0 +1,166 @@
+from bisect import bisect_right
+from datetime import datetime, timedelta, timezone, tzinfo
+from functools import lru_cache
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from app.core.config import settings
+
+# Сопоставление строк справочника с зонами IANA и таблицы смещений по зонам.
+# В CSV есть только смещения, поэтому зона берётся по коду региона, если для него
+# известна более точная зона, иначе - типичная зона для этого смещения от UTC.
+
+MOSCOW = "Europe/Moscow"
+
+ZONE_BY_UTC_OFFSET = {
+    2: "Europe/Kaliningrad",
+    3: "Europe/Moscow",
+    4: "Europe/Samara",
+    5: "Asia/Yekaterinburg",
+    6: "Asia/Omsk",
+    7: "Asia/Novosibirsk",
+    8: "Asia/Irkutsk",
+    9: "Asia/Yakutsk",
+    10: "Asia/Vladivostok",
+    11: "Asia/Magadan",
+    12: "Asia/Kamchatka",
+}
+
+# регионы, у которых своя история переходов (у Якутии несколько зон - берём по смещению)
+ZONE_BY_FIAS = {
+    "4": "Asia/Barnaul",
+    "17": "Asia/Krasnoyarsk",
+    "19": "Asia/Krasnoyarsk",
+    "22": "Asia/Barnaul",
+    "24": "Asia/Krasnoyarsk",
+    "30": "Europe/Astrakhan",
+    "34": "Europe/Volgograd",
+    "42": "Asia/Novokuznetsk",
+    "43": "Europe/Kirov",
+    "64": "Europe/Saratov",
+    "65": "Asia/Sakhalin",
+    "70": "Asia/Tomsk",
+    "73": "Europe/Ulyanovsk",
+    "75": "Asia/Chita",
+    "87": "Asia/Anadyr",
+    "91": "Europe/Simferopol",
+    "92": "Europe/Simferopol",
+}
+
+
+def _fixed_zone_name(utc_offset_hours: int) -> str:
+    # у Etc/GMT знак обратный: Etc/GMT-5 = UTC+5
+    return f"Etc/GMT{-utc_offset_hours:+d}" if utc_offset_hours else "Etc/UTC"
+
+
+@lru_cache(maxsize=None)
+def get_tz(name: str) -> tzinfo:
+    # один объект tzinfo на зону на весь процесс
+    try:
+        return ZoneInfo(name)
+    except ZoneInfoNotFoundError:
+        # нет базы tzdata - для Etc/GMT±N хватает фиксированного смещения
+        if name == "Etc/UTC":
+            return timezone.utc
+        if name.startswith("Etc/GMT"):
+            return timezone(timedelta(hours=-int(name[len("Etc/GMT"):])))
+        raise
+
+
+def _current_offset_hours(name: str, now: datetime) -> float | None:
+    try:
+        return now.astimezone(get_tz(name)).utcoffset().total_seconds() / 3600
+    except ZoneInfoNotFoundError:
+        return None
+
+
+def zone_for(fias_code: str, utc_offset_hours: int, now: datetime | None = None) -> str:
+    # Зона, чьё текущее смещение совпадает со справочником. Если справочник и tzdata
+    # расходятся, берём фиксированное смещение из справочника, чтобы не показать
+    # время, отличное от того, что видит пользователь в списке регионов.
+    now = now or datetime.now(timezone.utc)
+    for name in (ZONE_BY_FIAS.get(fias_code), ZONE_BY_UTC_OFFSET.get(utc_offset_hours)):
+        if name and _current_offset_hours(name, now) == utc_offset_hours:
+            return name
+    return _fixed_zone_name(utc_offset_hours)
+
+
+def moscow_offset_hours(now: datetime | None = None) -> int:
+    # смещение МСК от UTC по таблице переходов Europe/Moscow, а не константа +3
+    ts = (now or datetime.now(timezone.utc)).timestamp()
+    return get_offset_table(MOSCOW).offset_at(ts) // 3600
+
+
+def zone_for_msk_offset(msk_offset_hours: int, now: datetime | None = None) -> str:
+    # для участников известно только смещение от МСК
+    utc = msk_offset_hours + moscow_offset_hours(now)
+    return ZONE_BY_UTC_OFFSET.get(utc) or _fixed_zone_name(utc)
+
+
+class OffsetTable:
+    # Смещение зоны от UTC на отрезке [start, end): моменты переходов и смещения после них.
+    # Поиск смещения - один bisect; вне отрезка считаем через tzinfo напрямую.
+
+    def __init__(self, name: str, start: datetime, end: datetime):
+        self.name = name
+        self.tz = get_tz(name)
+        self.start = int(start.timestamp())
+        self.end = int(end.timestamp())
+
+        # переходы не бывают чаще раза в неделю, так что шага в 7 суток хватает
+        step = 7 * 86400
+        t = self.start
+        off = self._offset(t)
+        self.starts = [t]
+        self.offsets = [off]
+        while t < self.end:
+            t2 = min(t + step, self.end)
+            off2 = self._offset(t2)
+            if off2 != off:
+                # переход где-то внутри шага - ищем точную секунду
+                lo, hi = t, t2
+                while hi - lo > 1:
+                    mid = (lo + hi) // 2
+                    if self._offset(mid) == off:
+                        lo = mid
+                    else:
+                        hi = mid
+                self.starts.append(hi)
+                self.offsets.append(off2)
+                off = off2
+            t = t2
+
+    def _offset(self, ts: float) -> int:
+        return int(datetime.fromtimestamp(ts, self.tz).utcoffset().total_seconds())
+
+    def offset_at(self, ts: float) -> int:
+        if self.start <= ts < self.end:
+            return self.offsets[bisect_right(self.starts, ts) - 1]
+        return self._offset(ts)
+
+    def transitions(self) -> list[tuple[datetime, int]]:
+        return [(datetime.fromtimestamp(s, timezone.utc), o) for s, o in zip(self.starts[1:], self.offsets[1:])]
+
+
+_tables: dict[str, OffsetTable] = {}
+
+
+def _build(name: str, now: datetime) -> OffsetTable:
+    years = settings.timezones_offset_table_years
+    return OffsetTable(name, now - timedelta(days=1), now + timedelta(days=365 * years))
+
+
+def build_offset_tables(names, now: datetime | None = None) -> dict[str, OffsetTable]:
+    # таблицы на TIMEZONES_OFFSET_TABLE_YEARS лет вперёд, строятся при загрузке справочника
+    now = now or datetime.now(timezone.utc)
+    tables = {name: _build(name, now) for name in set(names)}
+    _tables.update(tables)
+    return tables
+
+
+def get_offset_table(name: str) -> OffsetTable:
+    table = _tables.get(name)
+    if table is None:
+        # зона, которой не было в справочнике (например, по смещению участника)
+        table = _build(name, datetime.now(timezone.utc))
+        _tables[name] = table
+    return table
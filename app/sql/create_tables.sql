@@ -1,3 +1,10 @@
+-- отпечаток схемы/миграций/справочника последнего бутстрапа (см. run_bootstrap)
+CREATE TABLE IF NOT EXISTS schema_state (
+    id boolean PRIMARY KEY DEFAULT true CHECK (id),
+    fingerprint text NOT NULL,
+    updated_at timestamptz NOT NULL DEFAULT now()
+);
+
 CREATE TABLE IF NOT EXISTS timezones (
     fias_code text PRIMARY KEY,
     region text NOT NULL,
@@ -23,13 +30,33 @@ CREATE TABLE IF NOT EXISTS groups (
     created_at timestamptz NOT NULL DEFAULT now()
 );
 
+-- 16 HASH-разделов по group_id создаёт миграция 008
 CREATE TABLE IF NOT EXISTS participants (
-    id bigserial PRIMARY KEY,
+    id bigserial,
     group_id bigint NOT NULL REFERENCES groups(id) ON DELETE CASCADE,
     user_id bigint REFERENCES users(id) ON DELETE SET NULL,
     display_name text NOT NULL,
     region text NULL,
     msk_offset_hours int NULL,
     joined_at timestamptz NOT NULL DEFAULT now(),
-    position int NOT NULL DEFAULT 0
-);
\ No newline at end of file
+    position int NOT NULL DEFAULT 0,
+    PRIMARY KEY (group_id, id)
+) PARTITION BY HASH (group_id);
+
+-- pg_trgm может быть не установлен (например, нет contrib) - тогда поиск просто без индекса
+DO $$
+BEGIN
+    CREATE EXTENSION IF NOT EXISTS pg_trgm;
+EXCEPTION WHEN others THEN
+    RAISE NOTICE 'pg_trgm is not available, region search will not use a trigram index';
+END
+$$;
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') THEN
+        CREATE INDEX IF NOT EXISTS timezones_region_norm_trgm_idx
+            ON timezones USING gin (region_norm gin_trgm_ops);
+    END IF;
+END
+$$;
@@ -0,0 +1,23 @@
+-- upsert_participant делает ON CONFLICT (group_id, user_id): нужен уникальный индекс.
+-- Перед его созданием убираем дубли, оставляя самую свежую запись.
+DELETE FROM participants p
+USING participants newer
+WHERE p.group_id = newer.group_id
+  AND p.user_id = newer.user_id
+  AND (p.joined_at, p.id) < (newer.joined_at, newer.id);
+
+CREATE UNIQUE INDEX IF NOT EXISTS participants_group_user_uq
+    ON participants (group_id, user_id);
+
+-- совпадает с ORDER BY в list_queue, поэтому очередь группы читается index scan без сортировки;
+-- ведущий group_id заодно обслуживает delete ... where group_id=%s
+CREATE INDEX IF NOT EXISTS participants_queue_order_idx
+    ON participants (group_id, (CASE WHEN position > 0 THEN 0 ELSE 1 END), position DESC, joined_at);
+
+-- group_exists
+CREATE INDEX IF NOT EXISTS groups_teacher_number_idx
+    ON groups (teacher_id, group_number);
+
+-- list_my_groups: where teacher_id=%s order by created_at desc
+CREATE INDEX IF NOT EXISTS groups_teacher_created_idx
+    ON groups (teacher_id, created_at DESC);
@@ -0,0 +1,6 @@
+-- очередь теперь упорядочивается по текущему местному часу при чтении (order_queue),
+-- из базы она читается в порядке joined_at
+CREATE INDEX IF NOT EXISTS participants_group_joined_idx
+    ON participants (group_id, joined_at, id);
+
+DROP INDEX IF EXISTS participants_queue_order_idx;
@@ -0,0 +1,6 @@
+-- хеш содержимого загруженных справочников: если файл не менялся, повторно не грузим
+CREATE TABLE IF NOT EXISTS catalog_sources (
+    name text PRIMARY KEY,
+    content_hash text NOT NULL,
+    loaded_at timestamptz NOT NULL DEFAULT now()
+);
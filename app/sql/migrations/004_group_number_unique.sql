@@ -0,0 +1,21 @@
+-- create_group различает конфликты через ON CONFLICT (teacher_id, group_number),
+-- для этого нужен уникальный индекс. Старые дубли переименовываем, оставляя самую раннюю группу.
+UPDATE groups g
+SET group_number = g.group_number || ' #' || g.id
+WHERE EXISTS (
+    SELECT 1
+    FROM groups o
+    WHERE o.teacher_id = g.teacher_id
+      AND o.group_number = g.group_number
+      AND (o.created_at, o.id) < (g.created_at, g.id)
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS groups_teacher_number_uq
+    ON groups (teacher_id, group_number);
+
+DROP INDEX IF EXISTS groups_teacher_number_idx;
+
+-- запас заранее сгенерированных кодов подключения (см. refill_join_codes)
+CREATE TABLE IF NOT EXISTS join_code_pool (
+    code text PRIMARY KEY
+);
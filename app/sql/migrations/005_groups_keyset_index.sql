@@ -0,0 +1,6 @@
+-- Постраничный /groups/my идёт по ключу (created_at, id) в обратном порядке:
+-- индекс с id позволяет брать следующую страницу без сортировки.
+CREATE INDEX IF NOT EXISTS groups_teacher_created_id_idx
+    ON groups (teacher_id, created_at DESC, id DESC);
+
+DROP INDEX IF EXISTS groups_teacher_created_idx;
@@ -0,0 +1,102 @@
+-- Участники хранятся по разделу на группу (LIST по group_id). Завершение сессии
+-- (POST /groups/{id}/finish) - TRUNCATE одного раздела вместо построчного DELETE:
+-- время не зависит от размера очереди и не остаётся мёртвых строк для autovacuum.
+-- Раздел создаётся вместе с группой (create_group -> ensure_participants_partition)
+-- и удаляется вместе с ней (триггер groups_drop_participants_partition), так что
+-- разделов столько же, сколько групп.
+
+-- Раздел создаётся отдельно и подключается через ATTACH: так на participants берётся
+-- только SHARE UPDATE EXCLUSIVE и чтение/запись очередей других групп не ждут.
+-- CHECK совпадает с границей раздела, поэтому ATTACH не сканирует таблицу.
+-- ATTACH копирует внешние ключи и берёт SHARE ROW EXCLUSIVE на groups и users,
+-- поэтому вызывается при создании группы, а не при входе в неё.
+CREATE OR REPLACE FUNCTION ensure_participants_partition(gid bigint) RETURNS void AS $$
+DECLARE
+    part text := 'participants_g' || gid;
+BEGIN
+    IF to_regclass(part) IS NOT NULL THEN
+        RETURN;
+    END IF;
+    -- два вызова для одной группы одновременно: второй дождётся первого (блокировка та же,
+    -- что берёт ATTACH, и с чтением/записью не конфликтует) и увидит уже созданный раздел
+    LOCK TABLE participants IN SHARE UPDATE EXCLUSIVE MODE;
+    IF to_regclass(part) IS NOT NULL THEN
+        RETURN;
+    END IF;
+    EXECUTE format(
+        'CREATE TABLE %I (LIKE participants INCLUDING DEFAULTS, CHECK (group_id = %s))', part, gid
+    );
+    EXECUTE format('ALTER TABLE participants ATTACH PARTITION %I FOR VALUES IN (%s)', part, gid);
+END
+$$ LANGUAGE plpgsql;
+
+-- В новой базе create_tables.sql уже создаёт секционированную таблицу; старую переносим.
+DO $$
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = 'participants'::regclass) = 'p' THEN
+        RETURN;
+    END IF;
+
+    ALTER TABLE participants RENAME TO participants_old;
+    ALTER TABLE participants_old RENAME CONSTRAINT participants_pkey TO participants_old_pkey;
+    ALTER INDEX participants_group_user_uq RENAME TO participants_old_group_user_uq;
+    ALTER INDEX participants_group_joined_idx RENAME TO participants_old_group_joined_idx;
+
+    CREATE TABLE participants (
+        id bigint NOT NULL DEFAULT nextval('participants_id_seq'),
+        group_id bigint NOT NULL REFERENCES groups(id) ON DELETE CASCADE,
+        user_id bigint REFERENCES users(id) ON DELETE SET NULL,
+        display_name text NOT NULL,
+        region text NULL,
+        msk_offset_hours int NULL,
+        joined_at timestamptz NOT NULL DEFAULT now(),
+        position int NOT NULL DEFAULT 0,
+        PRIMARY KEY (group_id, id)
+    ) PARTITION BY LIST (group_id);
+
+    CREATE UNIQUE INDEX participants_group_user_uq ON participants (group_id, user_id);
+    CREATE INDEX participants_group_joined_idx ON participants (group_id, joined_at, id);
+
+    PERFORM ensure_participants_partition(id) FROM groups;
+
+    INSERT INTO participants (id, group_id, user_id, display_name, region, msk_offset_hours, joined_at, position)
+    SELECT id, group_id, user_id, display_name, region, msk_offset_hours, joined_at, position
+    FROM participants_old;
+
+    ALTER SEQUENCE participants_id_seq OWNED BY participants.id;
+    DROP TABLE participants_old;
+END
+$$;
+
+SELECT ensure_participants_partition(id) FROM groups;
+
+-- Удаление группы убирает и её раздел. Строки к этому моменту уже удалены
+-- каскадом (триггеры внешних ключей срабатывают раньше). DROP раздела берёт
+-- ACCESS EXCLUSIVE на participants до commit - удаление группы должно быть коротким.
+CREATE OR REPLACE FUNCTION drop_participants_partition() RETURNS trigger AS $$
+BEGIN
+    EXECUTE format('DROP TABLE IF EXISTS %I', 'participants_g' || OLD.id);
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS groups_drop_participants_partition ON groups;
+CREATE TRIGGER groups_drop_participants_partition
+    AFTER DELETE ON groups
+    FOR EACH ROW EXECUTE FUNCTION drop_participants_partition();
+
+-- завершённые сессии (finish с архивом): строки переносятся сюда одним INSERT ... SELECT
+CREATE TABLE IF NOT EXISTS participants_history (
+    id bigint NOT NULL,
+    group_id bigint NOT NULL,
+    user_id bigint NULL,
+    display_name text NOT NULL,
+    region text NULL,
+    msk_offset_hours int NULL,
+    joined_at timestamptz NOT NULL,
+    position int NOT NULL,
+    finished_at timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS participants_history_group_idx
+    ON participants_history (group_id, finished_at);
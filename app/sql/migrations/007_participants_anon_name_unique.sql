@@ -0,0 +1,14 @@
+-- Участники из пакетного импорта без совпавшего пользователя (user_id is null) не попадают
+-- под ON CONFLICT (group_id, user_id), поэтому повторный импорт списка их дублировал.
+-- Для них ключ - имя внутри группы. Перед созданием индекса убираем дубли, оставляя самую свежую запись.
+DELETE FROM participants p
+USING participants newer
+WHERE p.group_id = newer.group_id
+  AND p.user_id IS NULL
+  AND newer.user_id IS NULL
+  AND p.display_name = newer.display_name
+  AND (p.joined_at, p.id) < (newer.joined_at, newer.id);
+
+CREATE UNIQUE INDEX IF NOT EXISTS participants_group_anon_name_uq
+    ON participants (group_id, display_name)
+    WHERE user_id IS NULL;
@@ -0,0 +1,62 @@
+-- Очередь хранится в фиксированном числе HASH-разделов по group_id вместо раздела
+-- на группу (миграция 006): число разделов не растёт с числом групп, во время работы
+-- нет DDL (ATTACH с блокировками groups/users и сбросом подготовленных планов),
+-- а generic-планы подготовленных запросов блокируют 16 разделов, а не по одному на группу.
+-- Завершение сессии - DELETE по индексу внутри одного раздела (см. clear_queue).
+
+DO $$
+DECLARE
+    parts constant int := 16;
+    converting boolean := (
+        SELECT partstrat FROM pg_partitioned_table WHERE partrelid = 'participants'::regclass
+    ) IS DISTINCT FROM 'h';
+BEGIN
+    IF converting THEN
+        ALTER TABLE participants RENAME TO participants_old;
+        ALTER TABLE participants_old RENAME CONSTRAINT participants_pkey TO participants_old_pkey;
+        ALTER INDEX participants_group_user_uq RENAME TO participants_old_group_user_uq;
+        ALTER INDEX participants_group_joined_idx RENAME TO participants_old_group_joined_idx;
+        ALTER INDEX participants_group_anon_name_uq RENAME TO participants_old_group_anon_name_uq;
+
+        CREATE TABLE participants (
+            id bigint NOT NULL DEFAULT nextval('participants_id_seq'),
+            group_id bigint NOT NULL REFERENCES groups(id) ON DELETE CASCADE,
+            user_id bigint REFERENCES users(id) ON DELETE SET NULL,
+            display_name text NOT NULL,
+            region text NULL,
+            msk_offset_hours int NULL,
+            joined_at timestamptz NOT NULL DEFAULT now(),
+            position int NOT NULL DEFAULT 0,
+            PRIMARY KEY (group_id, id)
+        ) PARTITION BY HASH (group_id);
+
+        CREATE UNIQUE INDEX participants_group_user_uq ON participants (group_id, user_id);
+        CREATE INDEX participants_group_joined_idx ON participants (group_id, joined_at, id);
+        CREATE UNIQUE INDEX participants_group_anon_name_uq
+            ON participants (group_id, display_name) WHERE user_id IS NULL;
+    END IF;
+
+    -- в новой базе create_tables.sql создаёт только саму таблицу, разделы - здесь
+    FOR i IN 0..parts - 1 LOOP
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS %I PARTITION OF participants FOR VALUES WITH (MODULUS %s, REMAINDER %s)',
+            'participants_h' || i, parts, i
+        );
+    END LOOP;
+
+    IF converting THEN
+        INSERT INTO participants (id, group_id, user_id, display_name, region, msk_offset_hours, joined_at, position)
+        SELECT id, group_id, user_id, display_name, region, msk_offset_hours, joined_at, position
+        FROM participants_old;
+
+        ALTER SEQUENCE participants_id_seq OWNED BY participants.id;
+        -- вместе с разделами participants_g<id>
+        DROP TABLE participants_old;
+    END IF;
+END
+$$;
+
+-- разделы на группу больше не создаются и не удаляются
+DROP TRIGGER IF EXISTS groups_drop_participants_partition ON groups;
+DROP FUNCTION IF EXISTS drop_participants_partition();
+DROP FUNCTION IF EXISTS ensure_participants_partition(bigint);
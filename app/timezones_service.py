@@ -2,9 +2,9 @@ import csv
 from dataclasses import dataclass
 from pathlib import Path
 from typing import List, Optional
-import re
 from datetime import datetime, timezone, timedelta
-from zoneinfo import ZoneInfo
+from app.core.normalize import norm_region, norm_text, parse_offset
+from app.services.zones import MOSCOW, get_tz, zone_for
 
 
 @dataclass(frozen=True)
@@ -13,47 +13,8 @@ class TimezoneRow:
     msk_offset_hours: int
     utc_offset_hours: int
     fias_code: str
-
-
-def _norm(s: str) -> str:
-    return (s or "").strip().lower().replace("ё", "е")
-
-def _norm_region(s: str) -> str:
-    s = (s or "").strip().lower().replace("ё", "е")
-    # убираем г. / город
-    s = re.sub(r"\bг\.\b|\bг\b|\bгород\b", " ", s)
-    # убираем знаки пунктуации
-    s = re.sub(r"[^a-zа-я0-9\s]+", " ", s)
-    
-    s = re.sub(r"\s+", " ", s).strip()
-    return s
-
-
-
-
-def _parse_int(value: str) -> int:
-    if value is None:
-        return 0
-
-    v = str(value).strip()
-    if not v:
-        return 0
-
-    low = v.lower().replace("ё", "е")
-
-    
-    if (("мск" in low) or ("msk" in low) or ("mck" in low)) and not re.search(r"\d", low):
-        return 0
-    if ("utc" in low) and not re.search(r"\d", low):
-        return 0
-
-    # Ищем первое целое число со знаком +3, -2, 4
-    m = re.search(r"[-+]\s*\d+|\d+", low)
-    if m:
-        return int(m.group(0).replace(" ", ""))
-
-    raise ValueError(f"Cannot parse offset from value: {value!r}")
-
+    region_norm: str = ""
+    tz_name: str = ""
 
 
 def load_timezones(csv_path: Path) -> List[TimezoneRow]:
@@ -64,36 +25,41 @@ def load_timezones(csv_path: Path) -> List[TimezoneRow]:
     with csv_path.open("r", encoding="utf-8", newline="") as f:
         reader = csv.DictReader(f, delimiter=";")
         for r in reader:
+            fias_code = str(r.get("Код КЛАДР (ФИАС)", "")).strip()
+            region = str(r.get("Регион РФ", "")).strip()
+            utc_offset = parse_offset(r.get("Номер часовой зоны (по UTC)", "0"), strict=True)
             rows.append(
                 TimezoneRow(
-                    fias_code=str(r.get("Код КЛАДР (ФИАС)", "")).strip(),
-                    region=str(r.get("Регион РФ", "")).strip(),
-                    msk_offset_hours=_parse_int(str(r.get("Номер часовой зоны (по МСК)", "0"))),
-                    utc_offset_hours=_parse_int(str(r.get("Номер часовой зоны (по UTC)", "0"))),
+                    fias_code=fias_code,
+                    region=region,
+                    msk_offset_hours=parse_offset(r.get("Номер часовой зоны (по МСК)", "0"), strict=True),
+                    utc_offset_hours=utc_offset,
+                    region_norm=norm_region(region),
+                    tz_name=zone_for(fias_code, utc_offset),
                 )
             )
     return rows
 
 
 def search_regions(rows: List[TimezoneRow], q: str, limit: int = 10) -> List[TimezoneRow]:
-    nq = _norm(q)
+    nq = norm_text(q)
     if not nq:
         return []
-    out = [r for r in rows if nq in _norm(r.region)]
+    out = [r for r in rows if nq in norm_text(r.region)]
     return out[: max(1, min(limit, 50))]
 
 
 def find_exact(rows: List[TimezoneRow], region: str) -> Optional[TimezoneRow]:
-    nr = _norm_region(region)
+    nr = norm_region(region)
 
     #точное совпадение после нормализации
     for r in rows:
-        if _norm_region(r.region) == nr:
+        if (r.region_norm or norm_region(r.region)) == nr:
             return r
 
     #если не нашли - пробуем частичное совпадение
     for r in rows:
-        if nr and nr in _norm_region(r.region):
+        if nr and nr in (r.region_norm or norm_region(r.region)):
             return r
 
     return None
@@ -103,9 +69,12 @@ def find_exact(rows: List[TimezoneRow], region: str) -> Optional[TimezoneRow]:
 
 def compute_times(row: TimezoneRow) -> dict:
     utc_now = datetime.now(timezone.utc)
-    msk_now = datetime.now(ZoneInfo("Europe/Moscow"))
+    msk_now = utc_now.astimezone(get_tz(MOSCOW))
 
-    local_now = utc_now + timedelta(hours=row.utc_offset_hours)
+    if row.tz_name:
+        local_now = utc_now.astimezone(get_tz(row.tz_name))
+    else:
+        local_now = utc_now + timedelta(hours=row.utc_offset_hours)
 
     return {
         "region": row.region,
@@ -0,0 +1,260 @@
+"""Нагрузочный прогон горячих эндпоинтов API: p50/p95/p99 и пропускная способность.
+
+Сценарии: login (/auth/login), join (/groups/join), queue (/groups/{id}/queue),
+search (/timezones/search). По умолчанию приложение поднимается в этом же
+процессе (httpx + ASGITransport) поверх Postgres из DATABASE_URL - лучше
+указывать одноразовую базу. С --base-url запросы идут в уже запущенный сервер.
+Нужен httpx (pip install httpx).
+
+    python -m bench.api_load --requests 500 --concurrency 50
+    python -m bench.api_load --scenarios search,queue --out after.json --baseline before.json
+
+В in-process режиме допуск запросов (ADMISSION_ENABLED) выключен: все запросы
+идут с одного адреса и упёрлись бы в лимиты по IP; --admission оставляет его
+включённым. Ответы 429/503 считаются отдельно (rejected), а не как ошибки,
+и не попадают в перцентили.
+
+С --baseline скрипт сравнивает результат с сохранённым прогоном (--out на
+прошлом коммите) и завершается с кодом 1, если p95 какого-то сценария вырос
+больше чем на --tolerance.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import sys
+import time
+import uuid
+from pathlib import Path
+
+import httpx
+
+API = "/api/v1"
+PASSWORD = "bench_pass"
+SEARCH_QUERIES = ["моск", "Башкортостан", "новосиб", "край", "респ", "Саха", "обл", "петер"]
+SCENARIOS = ["login", "join", "queue", "search"]
+# отказы допуска запросов (app.core.admission), а не ошибки
+REJECTED_STATUSES = {429, 503}
+
+
+def percentile(sorted_values: list[float], p: float) -> float:
+    # метод ближайшего ранга
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, int(round(p / 100 * len(sorted_values))) - 1))
+    return sorted_values[k]
+
+
+class Fixture:
+    # преподаватель, группа и студенты, общие для всех сценариев
+
+    def __init__(self):
+        self.teacher_token = ""
+        self.group_id = 0
+        self.join_code = ""
+        self.students: list[tuple[str, str]] = []  # (email, token)
+
+
+async def _register(client: httpx.AsyncClient, role: str, name: str, email: str) -> str:
+    r = await client.post(
+        f"{API}/auth/register",
+        json={"full_name": name, "email": email, "password": PASSWORD, "role": role},
+    )
+    r.raise_for_status()
+    return r.json()["access_token"]
+
+
+async def _prepare(client: httpx.AsyncClient, students: int) -> Fixture:
+    run_id = uuid.uuid4().hex[:8]
+    fx = Fixture()
+
+    fx.teacher_token = await _register(client, "teacher", "Bench Teacher", f"bench-t-{run_id}@example.com")
+    r = await client.post(
+        f"{API}/groups",
+        json={"group_number": f"L-{run_id}"},
+        headers={"Authorization": f"Bearer {fx.teacher_token}"},
+    )
+    r.raise_for_status()
+    fx.group_id = r.json()["id"]
+    fx.join_code = r.json()["join_code"]
+
+    # регистрация упирается в PBKDF2, поэтому готовим студентов небольшими порциями
+    sem = asyncio.Semaphore(8)
+
+    async def one(i: int) -> tuple[str, str]:
+        email = f"bench-s{i}-{run_id}@example.com"
+        async with sem:
+            token = await _register(client, "student", f"Student {i}", email)
+            # сразу в очередь, чтобы queue отдавал непустой список
+            await client.post(
+                f"{API}/groups/join",
+                json={"join_code": fx.join_code, "region": "Bench", "msk_offset_hours": i % 10},
+                headers={"Authorization": f"Bearer {token}"},
+            )
+        return email, token
+
+    fx.students = list(await asyncio.gather(*(one(i) for i in range(students))))
+    return fx
+
+
+def _request(scenario: str, fx: Fixture, i: int) -> tuple[str, str, dict]:
+    # (метод, путь, параметры httpx) для i-го запроса сценария
+    email, token = fx.students[i % len(fx.students)]
+    if scenario == "login":
+        return "POST", f"{API}/auth/login", {"json": {"email": email, "password": PASSWORD}}
+    if scenario == "join":
+        return "POST", f"{API}/groups/join", {
+            "json": {"join_code": fx.join_code, "region": "Bench", "msk_offset_hours": i % 10},
+            "headers": {"Authorization": f"Bearer {token}"},
+        }
+    if scenario == "queue":
+        return "GET", f"{API}/groups/{fx.group_id}/queue", {
+            "headers": {"Authorization": f"Bearer {fx.teacher_token}"},
+        }
+    if scenario == "search":
+        return "GET", f"{API}/timezones/search", {"params": {"q": SEARCH_QUERIES[i % len(SEARCH_QUERIES)]}}
+    raise ValueError(f"unknown scenario: {scenario}")
+
+
+async def _run_scenario(client: httpx.AsyncClient, fx: Fixture, scenario: str, requests: int, concurrency: int) -> dict:
+    sem = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    errors = 0
+    rejected = 0
+
+    async def one(i: int) -> None:
+        nonlocal errors, rejected
+        method, url, kwargs = _request(scenario, fx, i)
+        async with sem:
+            t0 = time.perf_counter()
+            try:
+                r = await client.request(method, url, **kwargs)
+                status = r.status_code
+            except httpx.HTTPError:
+                status = None
+            elapsed = time.perf_counter() - t0
+            if status in REJECTED_STATUSES:
+                # быстрый отказ исказил бы перцентили обработанных запросов
+                rejected += 1
+                return
+            latencies.append(elapsed)
+            if status != 200:
+                errors += 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - t0
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rejected": rejected,
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 4),
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+@contextlib.asynccontextmanager
+async def _client(base_url: str | None, admission: bool):
+    if base_url:
+        async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+            yield client
+        return
+
+    # настройки читаются при импорте app, поэтому до него
+    if not admission:
+        os.environ["ADMISSION_ENABLED"] = "0"
+    from app.main import app
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            yield client
+
+
+async def _run(args) -> dict:
+    results = {}
+    async with _client(args.base_url, args.admission) as client:
+        print(f"preparing {args.students} students...")
+        fx = await _prepare(client, args.students)
+
+        for scenario in args.scenarios:
+            if args.warmup:
+                await _run_scenario(client, fx, scenario, args.warmup, args.concurrency)
+            results[scenario] = await _run_scenario(client, fx, scenario, args.requests, args.concurrency)
+    return results
+
+
+def _print(results: dict, baseline: dict | None) -> None:
+    print(
+        f"\n{'scenario':10s} {'req':>6s} {'err':>5s} {'rej':>5s} {'rps':>9s} {'p50 ms':>9s} {'p95 ms':>9s} {'p99 ms':>9s}"
+    )
+    for name, r in results.items():
+        line = (
+            f"{name:10s} {r['requests']:6d} {r['errors']:5d} {r.get('rejected', 0):5d} {r['rps']:9.1f} "
+            f"{r['p50_ms']:9.2f} {r['p95_ms']:9.2f} {r['p99_ms']:9.2f}"
+        )
+        base = (baseline or {}).get(name)
+        if base and base["p95_ms"]:
+            line += f"   p95 {r['p95_ms'] / base['p95_ms'] - 1:+.0%} vs baseline"
+        print(line)
+
+
+def _regressions(results: dict, baseline: dict, tolerance: float, min_delta_ms: float) -> list[str]:
+    out = []
+    for name, r in results.items():
+        base = baseline.get(name)
+        # субмиллисекундные колебания - шум, а не регрессия
+        if (
+            base
+            and r["p95_ms"] > base["p95_ms"] * (1 + tolerance)
+            and r["p95_ms"] - base["p95_ms"] > min_delta_ms
+        ):
+            out.append(f"{name}: p95 {base['p95_ms']} -> {r['p95_ms']} ms")
+        if base is not None and r["errors"] > base["errors"]:
+            out.append(f"{name}: errors {base['errors']} -> {r['errors']}")
+    return out
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="через запятую: " + ",".join(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=500, help="запросов на сценарий")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--students", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=50, help="запросов на прогрев перед замером")
+    parser.add_argument("--base-url", default=None, help="адрес запущенного сервера вместо in-process")
+    parser.add_argument("--admission", action="store_true", help="не выключать допуск запросов в in-process режиме")
+    parser.add_argument("--out", type=Path, default=None, help="сохранить результат в JSON")
+    parser.add_argument("--baseline", type=Path, default=None, help="JSON прошлого прогона для сравнения")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="допустимый рост p95 (0.2 = +20%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="меньший рост p95 в мс не считается регрессией")
+    args = parser.parse_args()
+
+    args.scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    results = asyncio.run(_run(args))
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8")) if args.baseline else None
+    _print(results, baseline)
+
+    if args.out:
+        args.out.write_text(json.dumps(results, indent=2), encoding="utf-8")
+
+    if baseline:
+        bad = _regressions(results, baseline, args.tolerance, args.min_delta_ms)
+        if bad:
+            print("\nregressions:\n  " + "\n  ".join(bad))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Пропускная способность одновременных /groups/join.
+
+Приложение поднимается в этом же процессе (httpx + ASGITransport) поверх
+Postgres из DATABASE_URL, поэтому лучше указывать одноразовую базу.
+Нужен httpx (pip install httpx).
+
+    python -m bench.join_throughput --students 100 --concurrency 50
+
+Допуск запросов (ADMISSION_ENABLED) выключен: все запросы идут с одного адреса
+и при --students больше JOIN_RATE_PER_IP упёрлись бы в лимит по IP; --admission
+оставляет его включённым. Ответы 429/503 считаются отдельно (rejected), а не как
+ошибки, и не попадают в пропускную способность и перцентили.
+
+Чтобы сравнить "до/после", запустите скрипт на двух коммитах
+(git checkout <commit>) с одинаковыми параметрами.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+import uuid
+
+import httpx
+
+API = "/api/v1"
+# отказы допуска запросов (app.core.admission), а не ошибки
+REJECTED_STATUSES = {429, 503}
+
+
+async def _register(client: httpx.AsyncClient, role: str, name: str, email: str) -> str:
+    r = await client.post(
+        f"{API}/auth/register",
+        json={"full_name": name, "email": email, "password": "bench_pass", "role": role},
+    )
+    r.raise_for_status()
+    return r.json()["access_token"]
+
+
+async def _prepare(client: httpx.AsyncClient, students: int, concurrency: int) -> tuple[str, list[str]]:
+    run_id = uuid.uuid4().hex[:8]
+
+    teacher = await _register(client, "teacher", "Bench Teacher", f"bench-t-{run_id}@example.com")
+    r = await client.post(
+        f"{API}/groups",
+        json={"group_number": f"B-{run_id}"},
+        headers={"Authorization": f"Bearer {teacher}"},
+    )
+    r.raise_for_status()
+    join_code = r.json()["join_code"]
+
+    # регистрация упирается в PBKDF2, поэтому готовим студентов небольшими порциями
+    sem = asyncio.Semaphore(min(concurrency, 8))
+
+    async def one(i: int) -> str:
+        async with sem:
+            return await _register(client, "student", f"Student {i}", f"bench-s{i}-{run_id}@example.com")
+
+    tokens = await asyncio.gather(*(one(i) for i in range(students)))
+    return join_code, list(tokens)
+
+
+async def _run(students: int, concurrency: int, admission: bool) -> None:
+    # настройки читаются при импорте app, поэтому до него
+    if not admission:
+        os.environ["ADMISSION_ENABLED"] = "0"
+    from app.main import app
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            print(f"preparing {students} students...")
+            join_code, tokens = await _prepare(client, students, concurrency)
+
+            sem = asyncio.Semaphore(concurrency)
+            latencies: list[float] = []
+            errors = 0
+            rejected = 0
+
+            async def join(i: int, token: str) -> None:
+                nonlocal errors, rejected
+                async with sem:
+                    t0 = time.perf_counter()
+                    r = await client.post(
+                        f"{API}/groups/join",
+                        json={"join_code": join_code, "region": "Bench", "msk_offset_hours": i % 10},
+                        headers={"Authorization": f"Bearer {token}"},
+                    )
+                    if r.status_code in REJECTED_STATUSES:
+                        rejected += 1
+                        return
+                    latencies.append(time.perf_counter() - t0)
+                    if r.status_code != 200:
+                        errors += 1
+
+            t0 = time.perf_counter()
+            await asyncio.gather(*(join(i, t) for i, t in enumerate(tokens)))
+            elapsed = time.perf_counter() - t0
+
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else 0.0
+    print(f"joins:       {len(latencies)} (errors: {errors}, rejected: {rejected})")
+    print(f"concurrency: {concurrency}")
+    print(f"elapsed:     {elapsed:.3f} s")
+    print(f"throughput:  {len(latencies) / elapsed:.1f} req/s")
+    print(f"latency p50: {statistics.median(latencies) * 1000:.1f} ms, p95: {p95 * 1000:.1f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--admission", action="store_true", help="не выключать допуск запросов")
+    args = parser.parse_args()
+    asyncio.run(_run(args.students, args.concurrency, args.admission))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Стоимость одного вызова norm_region / parse_offset.
+
+Сравниваются прежняя реализация (re.sub со строковыми шаблонами на каждый
+вызов), скомпилированные регулярки без кэша и norm_region с LRU-кэшем.
+Входы - названия регионов из data/timezones.csv и типичные пользовательские
+запросы с опечатками и пунктуацией. База данных не нужна.
+
+    python -m bench.normalize --number 20000
+"""
+import argparse
+import csv
+import re
+import timeit
+from pathlib import Path
+
+from app.core import normalize
+
+CSV_PATH = Path(__file__).resolve().parent.parent / "data" / "timezones.csv"
+
+QUERIES = [
+    "Москва",
+    "г. Москва",
+    "  город Санкт-Петербург ",
+    "Башкортастан!",
+    "респ. Саха (Якутия)",
+    "Ханты-Мансийский АО — Югра",
+    "моск",
+    "Новосиб",
+]
+
+
+def legacy_norm_region(s: str) -> str:
+    s = (s or "").strip().lower().replace("ё", "е")
+    s = re.sub(r"\bг\.\b|\bг\b|\bгород\b", " ", s)
+    s = re.sub(r"[^a-zа-я0-9\s]+", " ", s)
+    s = re.sub(r"\s+", " ", s).strip()
+    return s
+
+
+def legacy_parse_offset(value: str) -> int:
+    v = (value or "").strip()
+    if not v:
+        return 0
+    low = v.lower()
+    if (("мск" in low) or ("msk" in low) or ("mck" in low)) and not re.search(r"\d", low):
+        return 0
+    if ("utc" in low) and not re.search(r"\d", low):
+        return 0
+    m = re.search(r"[-+]\s*\d+|\d+", low)
+    if m:
+        return int(m.group(0).replace(" ", ""))
+    return 0
+
+
+def _load_inputs() -> tuple[list[str], list[str]]:
+    regions, offsets = [], []
+    with CSV_PATH.open("r", encoding="utf-8", newline="") as f:
+        for r in csv.DictReader(f, delimiter=";"):
+            regions.append(r["Регион РФ"])
+            offsets.append(r["Номер часовой зоны (по МСК)"])
+            offsets.append(r["Номер часовой зоны (по UTC)"])
+    return regions + QUERIES, offsets
+
+
+def _per_call_ns(fn, inputs: list[str], number: int) -> float:
+    def run():
+        for s in inputs:
+            fn(s)
+
+    best = min(timeit.repeat(run, number=max(1, number // len(inputs)), repeat=5))
+    return best / (max(1, number // len(inputs)) * len(inputs)) * 1e9
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=20000, help="вызовов на один замер")
+    args = parser.parse_args()
+
+    names, offsets = _load_inputs()
+
+    # обе реализации должны давать одинаковый результат
+    for s in names:
+        assert normalize.norm_region(s) == legacy_norm_region(s), s
+    for s in offsets:
+        assert normalize.parse_offset(s) == legacy_parse_offset(s), s
+
+    normalize._norm_region_cached.cache_clear()
+    rows = [
+        ("norm_region, legacy re.sub", _per_call_ns(legacy_norm_region, names, args.number)),
+        ("norm_region, compiled", _per_call_ns(normalize._norm_region, names, args.number)),
+        ("norm_region, compiled + LRU", _per_call_ns(normalize.norm_region, names, args.number)),
+        ("parse_offset, legacy re.search", _per_call_ns(legacy_parse_offset, offsets, args.number)),
+        ("parse_offset, compiled", _per_call_ns(normalize.parse_offset, offsets, args.number)),
+    ]
+
+    print(f"inputs: {len(names)} names, {len(offsets)} offsets")
+    for name, ns in rows:
+        print(f"  {name:32s} {ns:8.0f} ns/call")
+    print(f"  lru: {normalize.norm_cache_stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Планы горячих запросов очереди и групп с индексами из миграций и без них.
+
+Скрипт в одной транзакции заполняет таблицы синтетическими данными, снимает
+EXPLAIN ANALYZE, затем удаляет индексы из миграций (DDL в Postgres
+транзакционный), снимает планы ещё раз и откатывает всё. Таблицы на время
+прогона блокируются, поэтому запускать на одноразовой базе из DATABASE_URL.
+
+    python -m bench.queue_plan --groups 200 --per-group 250
+"""
+import argparse
+
+import psycopg
+
+from app.core.config import settings
+
+QUERIES = {
+    "list_queue": (
+        """
+        select id, group_id, user_id, display_name, region, msk_offset_hours, joined_at
+        from participants
+        where group_id=%(group_id)s
+        order by joined_at, id
+        """
+    ),
+    "group_exists": (
+        "select 1 from groups where teacher_id=%(teacher_id)s and group_number=%(group_number)s limit 1"
+    ),
+    "list_my_groups": (
+        """
+        select id, teacher_id, group_number, join_code, created_at
+        from groups
+        where teacher_id=%(teacher_id)s
+        order by created_at desc
+        """
+    ),
+}
+
+MIGRATION_INDEXES = [
+    "participants_group_user_uq",
+    "participants_group_joined_idx",
+    "groups_teacher_number_uq",
+    "groups_teacher_created_id_idx",
+]
+
+
+def _seed(cur, groups: int, per_group: int, teachers: int) -> dict:
+    cur.execute(
+        """
+        insert into users (full_name, email, role, password_hash)
+        select 'Bench Teacher ' || i, 'bench-plan-' || i || '@example.com', 'teacher', 'x'
+        from generate_series(1, %s) i
+        returning id
+        """,
+        (teachers,),
+    )
+    teacher_ids = [r[0] for r in cur.fetchall()]
+
+    cur.execute(
+        """
+        insert into groups (teacher_id, group_number, join_code)
+        select (%s::bigint[])[1 + i %% %s], 'BENCH-' || i, 'BP' || lpad(i::text, 8, '0')
+        from generate_series(1, %s) i
+        returning id, teacher_id, group_number
+        """,
+        (teacher_ids, teachers, groups),
+    )
+    group_rows = cur.fetchall()
+
+    cur.execute(
+        """
+        insert into participants (group_id, user_id, display_name, msk_offset_hours, joined_at, position)
+        select g.id, null, 'Student ' || s, s %% 10, now() - s * interval '1 second', (s * 7) %% 24
+        from unnest(%s::bigint[]) g(id), generate_series(1, %s) s
+        """,
+        ([r[0] for r in group_rows], per_group),
+    )
+    cur.execute("analyze users")
+    cur.execute("analyze groups")
+    cur.execute("analyze participants")
+
+    mid = group_rows[len(group_rows) // 2]
+    return {"group_id": mid[0], "teacher_id": mid[1], "group_number": mid[2]}
+
+
+def _explain(cur, params: dict) -> dict:
+    out = {}
+    for name, sql in QUERIES.items():
+        cur.execute("explain (analyze, buffers, format json) " + sql, params)
+        plan = cur.fetchone()[0][0]
+        nodes = []
+        stack = [plan["Plan"]]
+        while stack:
+            node = stack.pop()
+            nodes.append(node["Node Type"])
+            stack.extend(node.get("Plans", []))
+        out[name] = {"nodes": nodes, "ms": plan["Execution Time"]}
+    return out
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--groups", type=int, default=200)
+    parser.add_argument("--per-group", type=int, default=250)
+    parser.add_argument("--teachers", type=int, default=20)
+    args = parser.parse_args()
+
+    with psycopg.connect(settings.database_url) as conn:
+        with conn.cursor() as cur:
+            params = _seed(cur, args.groups, args.per_group, args.teachers)
+            with_idx = _explain(cur, params)
+
+            for name in MIGRATION_INDEXES:
+                cur.execute(f"drop index if exists {name}")
+            without_idx = _explain(cur, params)
+        conn.rollback()
+
+    print(f"rows: {args.groups} groups x {args.per_group} participants")
+    for name in QUERIES:
+        a, b = without_idx[name], with_idx[name]
+        print(f"\n{name}")
+        print(f"  without indexes: {a['ms']:8.3f} ms  {' > '.join(a['nodes'])}")
+        print(f"  with indexes:    {b['ms']:8.3f} ms  {' > '.join(b['nodes'])}")
+
+
+if __name__ == "__main__":
+    main()
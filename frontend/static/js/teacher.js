@@ -1,4 +1,7 @@
 let GROUPS = []; 
+let QUEUE = [];
+let DAY_START_HOUR = 6; // приходит с сервера вместе с очередью
+let queueStream = null; // AbortController текущей подписки на очередь
 
 async function api(path, { method = "GET", body = null } = {}) {
     const token = localStorage.getItem("access_token");
@@ -103,6 +106,7 @@ async function loadGroups(selectAfterId = null) {
     const gid = currentGroupId();
     updateJoinCodeView(gid);
     await refreshQueue();
+    subscribeQueue();
     }
 
 async function refreshQueue() {
@@ -112,13 +116,104 @@ async function refreshQueue() {
     setStatus("Обновляю очередь…");
     try {
         const res = await api(`/groups/${gid}/queue`);
-        renderQueue(res.queue || []);
+        if (res.day_start_hour !== undefined) DAY_START_HOUR = res.day_start_hour;
+        QUEUE = res.queue || [];
+        renderQueue(QUEUE);
         setStatus("");
     } catch (e) {
         setStatus(`Ошибка: ${e.message}`);
     }
 }
 
+// тот же порядок, что и order_queue на сервере: по текущему местному часу
+// (от начала дня DAY_START_HOUR), внутри часа по joined_at, общая очередь в конце
+function queueRank(p, mskHour) {
+    if (p.msk_offset_hours === null || p.msk_offset_hours === undefined) {
+        p.position = 0;
+        return -1;
+    }
+    const hour = (((mskHour + p.msk_offset_hours) % 24) + 24) % 24;
+    p.position = hour;
+    return (hour - DAY_START_HOUR + 24) % 24;
+}
+
+// текущий час по Москве из базы зон браузера, а не UTC+3 - как MOSCOW на сервере
+const MSK_HOUR_FORMAT = new Intl.DateTimeFormat("en-GB", { timeZone: "Europe/Moscow", hour: "numeric", hourCycle: "h23" });
+
+function sortQueue(queue) {
+    const mskHour = Number(MSK_HOUR_FORMAT.format(new Date())) % 24;
+    const ranks = new Map(queue.map(p => [p.id, queueRank(p, mskHour)]));
+    return queue.sort((a, b) => {
+        const ra = ranks.get(a.id);
+        const rb = ranks.get(b.id);
+        if (ra !== rb) return rb - ra;
+        return a.joined_at < b.joined_at ? -1 : a.joined_at > b.joined_at ? 1 : 0;
+    });
+}
+
+function applyQueueEvent(ev) {
+    if (ev.op === "snapshot") {
+        if (ev.day_start_hour !== undefined) DAY_START_HOUR = ev.day_start_hour;
+        QUEUE = ev.queue || [];
+    } else if (ev.op === "upsert") {
+        QUEUE = QUEUE.filter(p => p.id !== ev.participant.id);
+        QUEUE.push(ev.participant);
+        sortQueue(QUEUE);
+    } else if (ev.op === "clear") {
+        QUEUE = [];
+    } else if (ev.op === "resync") {
+        refreshQueue();
+        return;
+    }
+    renderQueue(QUEUE);
+}
+
+// Живая очередь через Server-Sent Events. EventSource не умеет слать заголовок
+// Authorization, поэтому читаем поток через fetch.
+async function subscribeQueue() {
+    if (queueStream) queueStream.abort();
+    const gid = currentGroupId();
+    if (!gid) return;
+
+    const ctrl = new AbortController();
+    queueStream = ctrl;
+
+    try {
+        const res = await fetch(`/api/v1/groups/${gid}/queue/events`, {
+            headers: { "Authorization": `Bearer ${localStorage.getItem("access_token")}` },
+            signal: ctrl.signal,
+        });
+        if (!res.ok || !res.body) throw new Error(`HTTP ${res.status}`);
+
+        const reader = res.body.getReader();
+        const decoder = new TextDecoder();
+        let buf = "";
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buf += decoder.decode(value, { stream: true });
+
+            let sep;
+            while ((sep = buf.indexOf("\n\n")) >= 0) {
+                const chunk = buf.slice(0, sep);
+                buf = buf.slice(sep + 2);
+                const data = chunk
+                    .split("\n")
+                    .filter(l => l.startsWith("data: "))
+                    .map(l => l.slice(6))
+                    .join("\n");
+                if (data) applyQueueEvent(JSON.parse(data));
+            }
+        }
+    } catch (e) {
+        if (ctrl.signal.aborted) return;
+    }
+
+    // поток оборвался - переподключаемся, если группа не сменилась
+    if (queueStream === ctrl) setTimeout(subscribeQueue, 3000);
+}
+
 async function createGroup() {
     const num = document.getElementById("groupNumber").value.trim();
     if (!num) {
@@ -168,7 +263,11 @@ document.addEventListener("DOMContentLoaded", async () => {
     document.getElementById("groupSelect").addEventListener("change", async () => {
         updateJoinCodeView(currentGroupId());
         await refreshQueue();
+        subscribeQueue();
     });
 
     await loadGroups();
+
+    // порядок зависит от текущего часа - пересчитываем его раз в минуту
+    setInterval(() => renderQueue(sortQueue(QUEUE)), 60_000);
 });